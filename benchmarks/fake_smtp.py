@@ -0,0 +1,158 @@
+"""In-process SMTP sink for benchmarks.
+
+Speaks just enough ESMTP for both transports (EHLO with PIPELINING and AUTH,
+AUTH PLAIN/LOGIN, MAIL/RCPT/DATA, NOOP, RSET, QUIT). It accepts any
+credentials, keeps only counters, and can add latency and random errors to
+DATA, refuse given recipients and drop open connections. It does not offer STARTTLS, so benchmark configs set
+``smtp_starttls = false``.
+"""
+import random
+import socket
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str) -> None:
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        sink: "SmtpSink" = self.server.sink  # type: ignore[attr-defined]
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sink._count("connections")
+        with sink._lock:
+            sink._connections.add(self.connection)
+        try:
+            self._reply("220 benchmark sink ready")
+            self._serve(sink)
+        except OSError:
+            # Dropped by drop_connections
+            pass
+        finally:
+            with sink._lock:
+                sink._connections.discard(self.connection)
+
+    def _serve(self, sink: "SmtpSink") -> None:
+        # Accepted RCPTs of the current transaction
+        recipients = 0
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            cmd = raw.decode("utf-8", "replace").strip().upper()
+            if cmd.startswith(("EHLO", "HELO")):
+                self.wfile.write(b"250-benchmark\r\n250-PIPELINING\r\n250-8BITMIME\r\n250 AUTH PLAIN LOGIN\r\n")
+                self.wfile.flush()
+            elif cmd.startswith("AUTH LOGIN"):
+                self._reply("334 VXNlcm5hbWU6")
+                self.rfile.readline()
+                self._reply("334 UGFzc3dvcmQ6")
+                self.rfile.readline()
+                sink._count("logins")
+                self._reply("235 authenticated")
+            elif cmd.startswith("AUTH"):
+                sink._count("logins")
+                self._reply("235 authenticated")
+            elif cmd.startswith("DATA") and not recipients:
+                self._reply("554 no valid recipients")
+            elif cmd.startswith("DATA"):
+                recipients = 0
+                self._reply("354 end with <CRLF>.<CRLF>")
+                size = 0
+                while True:
+                    line = self.rfile.readline()
+                    if line in (b".\r\n", b""):
+                        break
+                    size += len(line)
+                if sink.latency:
+                    time.sleep(sink.latency)
+                code = sink._pick_error()
+                if code == 421:
+                    self._reply("421 service not available, closing channel")
+                    return
+                if code:
+                    self._reply(f"{code} injected failure")
+                    continue
+                sink._count("messages")
+                sink._count("bytes", size)
+                self._reply("250 queued")
+            elif cmd.startswith("RCPT") and cmd.partition("<")[2].rstrip(">").lower() in sink.refuse:
+                self._reply("550 5.1.1 no such user")
+            elif cmd.startswith("RCPT"):
+                recipients += 1
+                self._reply("250 ok")
+            elif cmd.startswith(("MAIL", "RSET")):
+                recipients = 0
+                self._reply("250 ok")
+            elif cmd.startswith("QUIT"):
+                self._reply("221 bye")
+                return
+            else:
+                # NOOP
+                self._reply("250 ok")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SmtpSink:
+    """Threaded SMTP sink on 127.0.0.1.
+
+    ``latency`` seconds are added to every DATA. ``error_rate`` is the share
+    of DATA commands that fail, drawn from ``error_codes`` (a 421 also closes
+    the connection). RCPT is answered with 550 for the addresses in ``refuse``.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, error_codes=(451, 421, 550), seed: int = 0,
+                 refuse=()):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.refuse = {address.lower() for address in refuse}
+        self.error_codes = tuple(error_codes)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._connections: set[socket.socket] = set()
+        self.stats = {"connections": 0, "logins": 0, "messages": 0, "bytes": 0, "errors": 0}
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.sink = self  # type: ignore[attr-defined]
+        self._thread: threading.Thread | None = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+    def _pick_error(self) -> int | None:
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            self.stats["errors"] += 1
+            return self._random.choice(self.error_codes)
+
+    def drop_connections(self) -> None:
+        """Close all open connections without a reply, like a server timing out idle clients."""
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def start(self) -> "SmtpSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,315 @@
+"""End-to-end throughput benchmark for bulk jobs.
+
+Each scenario runs in a fresh subprocess inside its own temporary working
+directory (the app resolves ``config.toml``, ``jobs/`` and ``excel_uploads/``
+relative to the cwd). It generates a synthetic recipient list, starts an
+in-process SMTP sink, drives ``JobManager`` with ``interval_minutes=0`` until
+the job completes and reports:
+
+- messages/sec and p50/p99 per-message send latency
+- peak RSS of the scenario process
+- bytes written below ``jobs/`` and ``excel_uploads/``
+
+Usage::
+
+    python -m benchmarks.run                          # 1k, 10k, 100k rows
+    python -m benchmarks.run --rows 1000 --latency 0.005 --transport asyncio
+    python -m benchmarks.run --compare old.json new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+BODY = "<p>Hallo,</p><p>dies ist eine Benchmark-Nachricht.</p>"
+SUBJECT = "Benchmark"
+PERSONALIZED_BODY = "<p>Hallo {{ vorname }},</p><p>dies ist eine Benchmark-Nachricht für {{ firma }}.</p>"
+PERSONALIZED_SUBJECT = "Benchmark für {{ firma }}"
+
+CONFIG_TEMPLATE = """\
+[mail]
+imap_host = "127.0.0.1"
+imap_port = 993
+smtp_host = "127.0.0.1"
+smtp_port = {port}
+smtp_starttls = false
+smtp_transport = "{transport}"
+
+[mail.accounts.bench]
+adress = "bench@example.com"
+password = "bench"
+max_concurrency = {concurrency}
+
+[scheduler]
+workdays = [0, 1, 2, 3, 4, 5, 6]
+start_hour = 0
+end_hour = 24
+
+# Injected 4xx errors are retried; keep the backoff short enough to finish the run
+[retry]
+base_delay = 0.05
+max_delay = 0.5
+"""
+
+
+class WriteMeter:
+    """Approximate bytes written below some directories, from ``open`` audit events.
+
+    A file opened for writing is measured the next time any tracked file is
+    opened or renamed, and once more at the end: its full size for truncating
+    modes, the growth since opening for appends.
+    """
+
+    def __init__(self, roots: list[Path]):
+        self.roots = [str(r.resolve()) for r in roots]
+        self.bytes = {Path(r).name: 0 for r in self.roots}
+        self._open: dict[str, tuple[str, bool, int]] = {}
+
+    def _root_of(self, path: str) -> str | None:
+        for root in self.roots:
+            if path.startswith(root + os.sep):
+                return Path(root).name
+        return None
+
+    def _settle(self) -> None:
+        for path, (root, append, start) in list(self._open.items()):
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                size = start
+            self.bytes[root] += max(0, size - start) if append else size
+        self._open.clear()
+
+    def _hook(self, event: str, args) -> None:
+        if event == "open":
+            path, mode, flags = args
+            if not isinstance(path, (str, bytes, os.PathLike)):
+                return
+            writing = ("w" in mode or "a" in mode or "x" in mode or "+" in mode) if isinstance(mode, str) \
+                else bool(flags & (os.O_WRONLY | os.O_RDWR))
+            if not writing:
+                return
+            full = os.path.abspath(os.fsdecode(path))
+            root = self._root_of(full)
+            if root is None:
+                return
+            self._settle()
+            append = isinstance(mode, str) and "a" in mode
+            start = os.stat(full).st_size if append and os.path.exists(full) else 0
+            self._open[full] = (root, append, start)
+        elif event in ("os.rename", "os.replace") and self._open:
+            self._settle()
+
+    def install(self) -> None:
+        sys.addaudithook(self._hook)
+
+    def totals(self) -> dict[str, int]:
+        self._settle()
+        return dict(self.bytes)
+
+
+def _percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def run_scenario(scenario: dict) -> dict:
+    """Run one scenario in the current process. Changes the cwd."""
+    from benchmarks.fake_smtp import SmtpSink
+    from benchmarks.workbooks import generate_workbook
+
+    workdir = Path(tempfile.mkdtemp(prefix="emailer-bench-"))
+    os.chdir(workdir)
+    for name in ("uploads", "excel_uploads", "jobs", "state", "outbox"):
+        (workdir / name).mkdir()
+    sink = SmtpSink(latency=scenario["latency"], error_rate=scenario["error_rate"]).start()
+    (workdir / "config.toml").write_text(
+        CONFIG_TEMPLATE.format(port=sink.port, transport=scenario["transport"], concurrency=scenario["concurrency"]),
+        encoding="utf-8",
+    )
+    file_name = f"recipients_{scenario['rows']}.{scenario['format']}"
+    generate_workbook(workdir / "excel_uploads" / file_name, scenario["rows"])
+
+    meter = WriteMeter([workdir / "jobs", workdir / "excel_uploads", workdir / "outbox"])
+    meter.install()
+
+    # Imported only now: the app creates its directories relative to the cwd
+    import emailer.services_jobs as services_jobs
+    from emailer.schemas import BulkJobRequest
+    from emailer.services_merge import template_fields
+    from emailer.services_smtp import smtp_pool
+    from emailer.services_smtp_async import async_smtp_pool
+
+    latencies: list[float] = []
+    deliver = services_jobs.deliver
+
+    async def timed_deliver(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await deliver(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    services_jobs.deliver = timed_deliver
+
+    html_body, betreff = BODY, SUBJECT
+    if scenario.get("personalized"):
+        html_body, betreff = PERSONALIZED_BODY, PERSONALIZED_SUBJECT
+    fields = template_fields(html_body, betreff)
+
+    async def drive() -> dict:
+        start = time.perf_counter()
+        scan = await asyncio.to_thread(services_jobs.scan_recipients, file_name, fields)
+        recipients = scan["recipients"]
+        import_seconds = time.perf_counter() - start
+        jm = services_jobs.JobManager()
+        jm.start()
+        req = BulkJobRequest(
+            html_body=html_body,
+            betreff=betreff,
+            batch_size=scenario["batch_size"],
+            interval_minutes=0,
+            file_id=file_name,
+        )
+        start = time.perf_counter()
+        job_id = await jm.add_job(recipients, req, scan["merge"])
+        deadline = start + scenario["timeout"]
+        job = jm.get_job(job_id)
+        while job and job["status"] != "completed" and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+            job = jm.get_job(job_id)
+        elapsed = time.perf_counter() - start
+        await jm.stop()
+        await async_smtp_pool.close_all()
+        await asyncio.to_thread(smtp_pool.close_all)
+        return {"job": job, "import_seconds": import_seconds, "elapsed": elapsed}
+
+    outcome = asyncio.run(drive())
+    sink.stop()
+    job = outcome["job"] or {}
+    elapsed = outcome["elapsed"]
+    return {
+        **scenario,
+        "completed": job.get("status") == "completed",
+        "recipients": job.get("total"),
+        "sent": job.get("sent"),
+        "failed": job.get("failed"),
+        "import_seconds": round(outcome["import_seconds"], 4),
+        "elapsed_seconds": round(elapsed, 4),
+        "messages_per_second": round((job.get("sent", 0) + job.get("failed", 0)) / elapsed, 2) if elapsed else None,
+        "latency_p50_ms": round(_percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "latency_p99_ms": round(_percentile(latencies, 99) * 1000, 3) if latencies else None,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "bytes_written": meter.totals(),
+        "smtp": dict(sink.stats),
+    }
+
+
+def _spawn(scenario: dict) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--worker", json.dumps(scenario)],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        return {**scenario, "error": proc.stderr.strip().splitlines()[-1:] or ["failed"]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(old_path: Path, new_path: Path) -> None:
+    old = {s["name"]: s for s in json.loads(old_path.read_text())["scenarios"]}
+    new = {s["name"]: s for s in json.loads(new_path.read_text())["scenarios"]}
+    keys = ("messages_per_second", "latency_p50_ms", "latency_p99_ms", "peak_rss_mb")
+    for name in sorted(old.keys() & new.keys()):
+        print(name)
+        for key in keys:
+            a, b = old[name].get(key), new[name].get(key)
+            ratio = f"x{b / a:.2f}" if a and b else "n/a"
+            print(f"  {key:22} {a!s:>12} -> {b!s:>12}  {ratio}")
+        wa, wb = old[name].get("bytes_written", {}), new[name].get("bytes_written", {})
+        for root in sorted(wa.keys() | wb.keys()):
+            print(f"  bytes_written[{root}] {wa.get(root)!s:>12} -> {wb.get(root)!s:>12}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--format", choices=["xlsx", "csv", "tsv"], default="xlsx")
+    parser.add_argument("--transport", choices=["thread", "asyncio"], default="thread")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4, help="max_concurrency of the sending account")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every DATA by the sink")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of DATA commands that fail")
+    parser.add_argument("--personalized", action="store_true", help="use {{ vorname }}/{{ firma }} placeholders")
+    parser.add_argument("--timeout", type=float, default=3600, help="give up on a scenario after this many seconds")
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        sys.path.insert(0, str(REPO_ROOT))
+        print(json.dumps(run_scenario(json.loads(args.worker))))
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = []
+    for rows in args.rows:
+        scenario = {
+            "name": f"{rows}-{args.format}-{args.transport}" + ("-personalized" if args.personalized else ""),
+            "rows": rows,
+            "format": args.format,
+            "transport": args.transport,
+            "batch_size": args.batch_size,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "personalized": args.personalized,
+            "timeout": args.timeout,
+        }
+        print(f"running {scenario['name']} ...", flush=True)
+        result = _spawn(scenario)
+        results.append(result)
+        print(json.dumps(result, indent=2), flush=True)
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "scenarios": results,
+    }, indent=2), encoding="utf-8")
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
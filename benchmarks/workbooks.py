@@ -0,0 +1,32 @@
+"""Synthetic recipient lists for benchmarks."""
+import csv
+from pathlib import Path
+
+import openpyxl
+
+
+HEADER = ["email", "vorname", "nachname", "firma", "ort"]
+
+
+def _row(i: int) -> list[str]:
+    return [f"user{i:07d}@example.com", f"Vorname{i}", f"Nachname{i}", f"Firma {i % 997}", f"Ort {i % 101}"]
+
+
+def generate_workbook(path: Path, rows: int) -> Path:
+    """Write an .xlsx (or .csv/.tsv, by suffix) with a header and ``rows`` unique addresses."""
+    path = Path(path)
+    if path.suffix.lower() in (".csv", ".tsv"):
+        delimiter = "\t" if path.suffix.lower() == ".tsv" else ","
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter=delimiter)
+            writer.writerow(HEADER)
+            writer.writerows(_row(i) for i in range(rows))
+        return path
+    # write_only keeps generation of 100k-row sheets fast and small
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(HEADER)
+    for i in range(rows):
+        ws.append(_row(i))
+    wb.save(path)
+    return path
@@ -1,8 +1,14 @@
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from emailer.paths import STATIC_DIR, TINYMCE_DIR, UPLOAD_DIR
-from emailer.routes import router
+from emailer.routes import router, job_manager
 from emailer.services_mail import validate_mail_credentials
+from emailer.services_imap import run_suppression_sync
+from emailer.services_smtp import smtp_pool
+from emailer.services_smtp_async import async_smtp_pool
+from emailer.services_contacts import flush_all as flush_contact_states
+from emailer.services_history import contact_history
+from emailer.utils.settings import get_mail_settings
 
 
 app = FastAPI()
@@ -14,16 +20,61 @@ app.include_router(router)
 
 @app.on_event("startup")
 async def validate_credentials_on_startup():
-    results = await _validate_credentials_async()
-    # Log to stdout; do not crash startup to allow UI to load
-    for addr, status in results.items():
-        print(f"SMTP credentials check for {addr}: {status}")
+    import asyncio
+    # Runs in the background so a slow SMTP server does not delay readiness
+    asyncio.create_task(_log_credential_checks())
+
+
+@app.on_event("startup")
+async def start_job_scheduler():
+    job_manager.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_scheduler():
+    await job_manager.stop()
+
+
+@app.on_event("startup")
+async def start_smtp_reaper():
+    import asyncio
+    asyncio.create_task(_reap_idle_smtp_sessions())
+
+
+@app.on_event("startup")
+async def start_suppression_sync():
+    import asyncio
+    asyncio.create_task(run_suppression_sync())
+
+
+@app.on_event("shutdown")
+async def close_smtp_sessions():
+    import asyncio
+    await asyncio.to_thread(smtp_pool.close_all)
+    await async_smtp_pool.close_all()
+
+
+@app.on_event("shutdown")
+async def write_back_contacted_flags():
+    import asyncio
+    await asyncio.to_thread(contact_history.flush)
+    await asyncio.to_thread(flush_contact_states)
 
 
-async def _validate_credentials_async():
-    # Run sync validation in thread to avoid blocking event loop
+async def _reap_idle_smtp_sessions():
     import asyncio
-    return await asyncio.to_thread(validate_mail_credentials)
+    while True:
+        ttl = get_mail_settings().smtp_idle_ttl
+        await asyncio.sleep(max(1, ttl / 2))
+        await asyncio.to_thread(smtp_pool.reap_idle)
+        await async_smtp_pool.reap_idle()
+
+
+async def _log_credential_checks():
+    results = await validate_mail_credentials()
+    # Log to stdout; do not crash startup to allow UI to load
+    for addr, status in results.items():
+        print(f"SMTP credentials check for {addr}: {status}")
 
 
 if __name__ == "__main__":
@@ -14,4 +14,8 @@ EXCEL_DIR.mkdir(exist_ok=True)
 JOBS_DIR = Path("jobs")
 JOBS_DIR.mkdir(exist_ok=True)
 
+STATE_DIR = Path("state")
+STATE_DIR.mkdir(exist_ok=True)
 
+OUTBOX_DIR = Path("outbox")
+OUTBOX_DIR.mkdir(exist_ok=True)
@@ -1,21 +1,46 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-import uuid
+from datetime import datetime
 from pathlib import Path
 import asyncio
+import csv
+import io
+import json
 
 from emailer.schemas import SendMailRequest, BulkJobRequest
-from emailer.services_mail import resolve_account, build_message, send_via_smtp
-from emailer.services_jobs import JobManager, load_recipients_from_excel
-from emailer.utils.settings import get_mail_settings
+from emailer.services_mail import resolve_account, build_message, deliver
+from emailer.services_ratelimit import RateLimitExceeded
+from emailer.services_jobs import JobManager, scan_recipients
+from emailer.services_merge import template_fields
+from emailer.services_pacing import job_calendar, send_until_timestamp
+from emailer.services_outbox import FOLDERS as OUTBOX_FOLDERS, NEW
+from emailer.services_imap import sync_suppressions
+from emailer.services_suppression import suppression_list
+from emailer.services_history import HISTORY_COLUMNS, contact_history
+from emailer.utils.metrics import registry
+from emailer.services_uploads import safe_suffix, store_upload
+from emailer.utils.settings import BERLIN_TZ, get_mail_settings, get_settings, now_berlin, reload_settings
+from emailer.utils.tables import TABLE_SUFFIXES
 from emailer.paths import UPLOAD_DIR, EXCEL_DIR
 
 
 templates = Jinja2Templates(directory="emailer/templates")
 router = APIRouter()
 
+# Ad-hoc sends wait this long for a rate-limit token before answering 429
+SENDMAIL_MAX_WAIT_SECONDS = 30
+
+JOBS_PAGE_MAX = 500
+SUPPRESSIONS_PAGE_MAX = 1000
+HISTORY_PAGE_MAX = 1000
+OUTBOX_PAGE_MAX = 1000
+# Progress streams send at most one event per interval, whatever the send rate
+PROGRESS_STREAM_INTERVAL_SECONDS = 1.0
+PROGRESS_KEEPALIVE_SECONDS = 15
+
 
 @router.get("/")
 async def read_root(request: Request):
@@ -26,19 +51,19 @@ async def read_root(request: Request):
 async def upload_image(file: UploadFile = File(...)):
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Only image files allowed")
-    ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    path = UPLOAD_DIR / f"{uuid.uuid4()}.{ext}"
-    path.write_bytes(await file.read())
+    limit = get_settings().uploads.max_image_bytes
+    path, _ = await store_upload(file, UPLOAD_DIR, safe_suffix(file.filename, ".jpg"), limit)
     return {"location": f"/uploads/{path.name}"}
 
 
 @router.post("/upload-recipients")
 async def upload_recipients(file: UploadFile = File(...)):
-    if not file.filename.lower().endswith((".xlsx", ".xlsm")):
-        raise HTTPException(status_code=400, detail="Only Excel .xlsx/.xlsm files allowed")
-    dest = EXCEL_DIR / f"{uuid.uuid4()}_{file.filename}"
-    dest.write_bytes(await file.read())
-    return {"file_id": dest.name}
+    if not file.filename.lower().endswith(TABLE_SUFFIXES):
+        raise HTTPException(status_code=400, detail="Only .xlsx/.xlsm/.csv/.tsv files allowed")
+    limit = get_settings().uploads.max_recipients_bytes
+    # Same content maps to the same file_id, so contacted flags carry over to a re-upload
+    dest, existing = await store_upload(file, EXCEL_DIR, safe_suffix(file.filename, ""), limit)
+    return {"file_id": dest.name, "existing": existing}
 
 
 @router.post("/sendmail")
@@ -46,9 +71,12 @@ async def send_mail(payload: SendMailRequest):
     account = resolve_account(payload.from_address)
     msg = build_message(account, payload)
     try:
-        await asyncio.to_thread(send_via_smtp, account, msg)
+        await deliver(account, msg, max_wait=SENDMAIL_MAX_WAIT_SECONDS)
+    except RateLimitExceeded as exc:
+        raise HTTPException(status_code=429, detail=str(exc))
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to send email: {exc}")
+    await asyncio.to_thread(contact_history.record, str(payload.recipient), account.address)
     return {"status": "sent"}
 
 
@@ -56,28 +84,188 @@ job_manager = JobManager()
 job_manager.load_existing()
 
 
+def _check_pacing(req: BulkJobRequest, accounts: list) -> None:
+    if req.send_until is not None and req.per_hour is not None:
+        raise HTTPException(status_code=400, detail="Set either send_until or per_hour, not both")
+    if req.per_hour is not None and req.per_hour <= 0:
+        raise HTTPException(status_code=400, detail="per_hour must be positive")
+    calendar = job_calendar(accounts)
+    now = now_berlin().timestamp()
+    try:
+        calendar.next_open(now)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="The sender accounts share no work window")
+    until = send_until_timestamp(req)
+    if until is not None and calendar.open_seconds(now, until) <= 0:
+        raise HTTPException(status_code=400, detail="No work time left before send_until")
+
+
 @router.post("/start-bulk")
 async def start_bulk(req: BulkJobRequest):
-    recipients = load_recipients_from_excel(req.file_id)
+    accounts = [resolve_account(address) for address in req.accounts or [req.from_address]]
+    _check_pacing(req, accounts)
+    fields = template_fields(req.html_body, req.betreff)
+    scan = await asyncio.to_thread(scan_recipients, req.file_id, fields, req.skip_contacted)
+    recipients = scan["recipients"]
     if not recipients:
-        raise HTTPException(status_code=400, detail="No recipients found in file")
-    job_id = await job_manager.add_job(recipients, req)
-    return {"job_id": job_id, "total": len(recipients)}
+        detail = "No recipients found in file"
+        if scan["rejected_count"] or scan["suppressed"] or scan["previously_contacted"]:
+            detail = (
+                f"No valid recipients found in file ({scan['rejected_count']} invalid addresses,"
+                f" {scan['suppressed']} suppressed, {scan['previously_contacted']} contacted before)"
+            )
+        raise HTTPException(status_code=400, detail=detail)
+    job_id = await job_manager.add_job(recipients, req, scan["merge"])
+    return {
+        "job_id": job_id,
+        "total": len(recipients),
+        "rejected": scan["rejected"],
+        "rejected_count": scan["rejected_count"],
+        "duplicates": scan["duplicates"],
+        "suppressed": scan["suppressed"],
+        "previously_contacted": scan["previously_contacted"],
+    }
 
 
 @router.get("/jobs")
-async def jobs():
-    return {"jobs": job_manager.list_jobs()}
+async def jobs(
+    status: list[str] | None = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=JOBS_PAGE_MAX),
+):
+    page, total = await job_manager.list_jobs(status, offset, limit)
+    return {"jobs": page, "total": total, "offset": offset, "limit": limit}
+
+
+@router.get("/jobs/stream")
+async def job_progress_stream(request: Request):
+    """Server-sent events: a 'progress' event lists every job that changed since the last one."""
+    subscription = job_manager.subscribe()
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                updates = await subscription.next(PROGRESS_KEEPALIVE_SECONDS)
+                if updates:
+                    yield f"event: progress\ndata: {json.dumps(updates)}\n\n"
+                    await asyncio.sleep(PROGRESS_STREAM_INTERVAL_SECONDS)
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            job_manager.unsubscribe(subscription)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+@router.get("/jobs/{job_id}/failures")
+async def job_failures(job_id: str):
+    report = await asyncio.to_thread(job_manager.get_failures, job_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return report
+
+
+@router.get("/jobs/{job_id}/outbox")
+async def job_outbox(
+    job_id: str,
+    folder: str = Query(NEW),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=OUTBOX_PAGE_MAX),
+):
+    if folder not in OUTBOX_FOLDERS:
+        raise HTTPException(status_code=400, detail=f"folder must be one of: {', '.join(OUTBOX_FOLDERS)}")
+    report = await asyncio.to_thread(job_manager.get_outbox, job_id, folder, offset, limit)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return report
+
+
+@router.get("/jobs/{job_id}/outbox/{index}")
+async def job_outbox_message(job_id: str, index: int):
+    data = await asyncio.to_thread(job_manager.outbox_message, job_id, index)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Message not in the outbox")
+    return Response(content=data, media_type="message/rfc822")
 
 
 @router.post("/jobs/{job_id}/cancel")
 async def cancel_job(job_id: str):
-    ok = job_manager.cancel_job(job_id)
+    ok = await job_manager.cancel_job(job_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Job not found")
     return {"status": "cancelled"}
 
 
+@router.get("/suppressions")
+async def suppressions(offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=SUPPRESSIONS_PAGE_MAX)):
+    page, total = await asyncio.to_thread(suppression_list.page, offset, limit)
+    return {"suppressions": page, "total": total, "offset": offset, "limit": limit}
+
+
+@router.post("/suppressions/sync")
+async def sync_suppression_list():
+    """Read new bounces and unsubscribe replies from every account's mailbox now."""
+    return {"accounts": await sync_suppressions()}
+
+
+def _timestamp(value: datetime | None) -> float | None:
+    if value is None:
+        return None
+    # Times without an offset are local (Berlin), like the work schedule
+    return (value if value.tzinfo else value.replace(tzinfo=BERLIN_TZ)).timestamp()
+
+
+@router.get("/contact-history")
+async def contact_history_page(
+    email: str | None = None,
+    job: str | None = None,
+    account: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=HISTORY_PAGE_MAX),
+):
+    """Sends recorded in the contact history, newest first; ``since``/``until`` are ISO 8601 times."""
+    page, total = await asyncio.to_thread(
+        contact_history.page, offset, limit, email, job, account, _timestamp(since), _timestamp(until)
+    )
+    return {"contacts": page, "total": total, "offset": offset, "limit": limit}
+
+
+@router.get("/contact-history/export")
+async def export_contact_history(
+    email: str | None = None,
+    job: str | None = None,
+    account: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    """The matching contact history as CSV, oldest first, streamed in chunks."""
+    rows = contact_history.iter_rows(email, job, account, _timestamp(since), _timestamp(until))
+
+    def lines():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(HISTORY_COLUMNS)
+        for row in rows:
+            address, sent, *rest = row
+            writer.writerow([address, datetime.fromtimestamp(sent, BERLIN_TZ).isoformat(timespec="seconds"), *rest])
+            if buf.tell() >= 64 * 1024:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    # A sync generator, so Starlette runs each chunk's queries in its thread pool
+    return StreamingResponse(
+        lines(),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="contact-history.csv"'},
+    )
+
+
 @router.get("/mail-accounts")
 async def list_mail_accounts():
     settings = get_mail_settings()
@@ -97,3 +285,15 @@ async def list_mail_accounts():
     return {"accounts": unique}
 
 
+@router.post("/reload-settings")
+async def reload_config():
+    try:
+        reload_settings()
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid configuration: {exc}")
+    return {"status": "reloaded"}
+
+
+@router.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
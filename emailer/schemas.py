@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel, EmailStr
 
 
@@ -15,5 +17,13 @@ class BulkJobRequest(BaseModel):
     batch_size: int
     interval_minutes: int
     file_id: str
-
-
+    # Spread each batch over these sender addresses instead of from_address alone
+    accounts: list[str] | None = None
+    # Leave out addresses sent to from any earlier list or job; off for deliberate follow-ups
+    skip_contacted: bool = True
+    # Spread the sends evenly so the last goes out by then (times without a zone are Berlin time)
+    send_until: datetime | None = None
+    # Or send at this steady rate; without either, batch_size mails per interval_minutes, evenly spaced
+    per_hour: float | None = None
+    # Only render every message into outbox/<job id>/new for inspection; nothing is sent
+    dry_run: bool = False
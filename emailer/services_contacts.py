@@ -0,0 +1,214 @@
+import csv
+import os
+import threading
+import time
+from pathlib import Path
+
+import openpyxl
+
+from emailer.paths import EXCEL_DIR
+from emailer.utils.addresses import contact_key
+from emailer.utils.files import file_lock
+from emailer.utils.settings import get_settings
+from emailer.utils.tables import header_index, is_text_table, iter_table_rows, text_table_format
+
+
+def find_header_column(ws, name: str) -> int | None:
+    """Return the 1-based column whose header (row 1) matches name, case-insensitively."""
+    for c in range(1, (ws.max_column or 1) + 1):
+        val = ws.cell(row=1, column=c).value
+        if isinstance(val, str) and val.strip().lower() == name:
+            return c
+    return None
+
+
+def ensure_kontaktiert_column(ws) -> int:
+    kontakt_col = find_header_column(ws, "kontaktiert")
+    if kontakt_col is None:
+        kontakt_col = (ws.max_column or 1) + 1
+        ws.cell(row=1, column=kontakt_col, value="kontaktiert")
+    return kontakt_col
+
+
+def _sidecar_path(path: Path) -> Path:
+    return path.with_name(path.name + ".contacted")
+
+
+def _lock_path(path: Path) -> Path:
+    return path.with_name(path.name + ".lock")
+
+
+def _written_back_path(path: Path) -> Path:
+    return path.with_name(f"{path.stem}.kontaktiert{path.suffix}")
+
+
+class ContactState:
+    """Contacted flags for one uploaded recipient file.
+
+    Successful sends are marked in memory and appended to a sidecar file next
+    to the workbook by ``sync``, with one fsync per job step, so they survive
+    a crash. Marks a crash catches before the sync belong to messages still in
+    the job's outbox and are made again when the job is taken over. The
+    ``kontaktiert`` column is only written in batches by ``flush``, into a
+    copy next to the upload (``<name>.kontaktiert<suffix>``), so the upload
+    keeps matching the content hash it is stored under. Processes sharing
+    the upload share the sidecar; a lock file next to it serializes appends
+    and write-backs, and a write-back takes in the marks of all of them.
+    """
+
+    def __init__(self, file_name: str):
+        self.path = EXCEL_DIR / file_name
+        self.sidecar = _sidecar_path(self.path)
+        self.lock_path = _lock_path(self.path)
+        self.written_back = _written_back_path(self.path)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._index: dict[str, list[int]] | None = None
+        self._pending: set[str] = set()
+        # Marked but not yet in the sidecar
+        self._unsynced: list[str] = []
+        self._last_flush = time.monotonic()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Pick up marks appended to the sidecar by another process."""
+        with self._lock:
+            if self.sidecar.exists():
+                for line in self.sidecar.read_text(encoding="utf-8").splitlines():
+                    if line.strip():
+                        self._pending.add(line.strip())
+
+    def table_path(self) -> Path:
+        """The list to read: the written-back copy once there is one, else the upload."""
+        return self.written_back if self.written_back.exists() else self.path
+
+    def is_contacted(self, email: str) -> bool:
+        """True if the address was sent to but not yet written back to the workbook."""
+        with self._lock:
+            return contact_key(email) in self._pending
+
+    def mark(self, email: str) -> None:
+        target = contact_key(email)
+        if not target:
+            return
+        with self._lock:
+            if target in self._pending:
+                return
+            self._pending.add(target)
+            self._unsynced.append(target)
+
+    def sync(self) -> None:
+        """Append the marks made since the last sync to the sidecar, with a single fsync."""
+        with file_lock(self.lock_path):
+            with self._lock:
+                marks, self._unsynced = self._unsynced, []
+            if not marks:
+                return
+            with open(self.sidecar, "a", encoding="utf-8") as f:
+                f.write("".join(e + "\n" for e in marks))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def flush_due(self) -> bool:
+        interval = get_settings().contacts.flush_interval
+        with self._lock:
+            return bool(self._pending) and time.monotonic() - self._last_flush >= interval
+
+    def _build_index(self, source: Path) -> dict[str, list[int]]:
+        index: dict[str, list[int]] = {}
+        rows = iter_table_rows(source)
+        email_idx = header_index(next(rows, None) or (), "email")
+        if email_idx is None:
+            return index
+        for r, row in enumerate(rows, start=2):
+            val = row[email_idx] if email_idx < len(row) else None
+            if isinstance(val, str) and val.strip():
+                index.setdefault(contact_key(val), []).append(r)
+        return index
+
+    def _write_workbook(self, source: Path, pending: set[str], tmp: Path) -> None:
+        if self._index is None:
+            self._index = self._build_index(source)
+        wb = openpyxl.load_workbook(source)
+        ws = wb.active
+        kontakt_col = ensure_kontaktiert_column(ws)
+        for email in pending:
+            for r in self._index.get(email, ()):
+                ws.cell(row=r, column=kontakt_col, value=True)
+        wb.save(tmp)
+
+    def _write_text_table(self, source: Path, pending: set[str], tmp: Path) -> None:
+        encoding, dialect = text_table_format(source)
+        # A Windows-1252 export stays one, so Excel still opens it the same way
+        with open(source, newline="", encoding=encoding) as src, \
+                open(tmp, "w", newline="", encoding="utf-8" if encoding == "utf-8-sig" else encoding) as dst:
+            reader = csv.reader(src, **dialect)
+            writer = csv.writer(dst, **dialect)
+            header = next(reader, None)
+            if header is None:
+                return
+            email_idx = header_index(tuple(header), "email")
+            kontakt_idx = header_index(tuple(header), "kontaktiert")
+            if kontakt_idx is None:
+                kontakt_idx = len(header)
+                header.append("kontaktiert")
+            writer.writerow(header)
+            for row in reader:
+                if len(row) <= kontakt_idx:
+                    row.extend([""] * (kontakt_idx + 1 - len(row)))
+                email = contact_key(row[email_idx]) if email_idx is not None and email_idx < len(row) else ""
+                if email in pending:
+                    row[kontakt_idx] = "TRUE"
+                writer.writerow(row)
+
+    def flush(self) -> None:
+        """Write pending contacted flags into the written-back copy and clear the sidecar."""
+        # Keep the marks safe should the file turn out not to be writable
+        self.sync()
+        with self._flush_lock, file_lock(self.lock_path):
+            # Other processes may have marked addresses of the same upload since
+            self.refresh()
+            with self._lock:
+                pending = set(self._pending)
+                self._last_flush = time.monotonic()
+            if not pending or not self.path.exists():
+                return
+            source = self.table_path()
+            # Replace atomically so a crash never leaves a truncated file
+            tmp = self.written_back.with_name(self.written_back.name + ".tmp")
+            if is_text_table(self.path):
+                self._write_text_table(source, pending, tmp)
+            else:
+                self._write_workbook(source, pending, tmp)
+            os.replace(tmp, self.written_back)
+            with self._lock:
+                self._pending -= pending
+                remaining = sorted(self._pending)
+                self._unsynced = []
+            # Rewrite the sidecar with what was marked while we were saving
+            tmp_sidecar = self.sidecar.with_name(self.sidecar.name + ".tmp")
+            tmp_sidecar.write_text("".join(e + "\n" for e in remaining), encoding="utf-8")
+            os.replace(tmp_sidecar, self.sidecar)
+
+
+_states: dict[str, ContactState] = {}
+_states_lock = threading.Lock()
+
+
+def contact_state(file_name: str) -> ContactState:
+    with _states_lock:
+        state = _states.get(file_name)
+        if state is None:
+            state = ContactState(file_name)
+            _states[file_name] = state
+        return state
+
+
+def flush_all() -> None:
+    with _states_lock:
+        states = list(_states.values())
+    for state in states:
+        try:
+            state.flush()
+        except Exception as exc:
+            print(f"Failed to write back contacted flags for {state.path.name}: {exc}")
@@ -0,0 +1,163 @@
+import sqlite3
+import threading
+import time
+from typing import Iterable, Iterator
+
+from emailer.paths import STATE_DIR
+from emailer.utils.addresses import contact_key
+
+
+HISTORY_DB_PATH = STATE_DIR / "history.db"
+
+# Columns of a history entry, in export order
+HISTORY_COLUMNS = ("email", "sent", "account", "job", "file")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    key TEXT NOT NULL,
+    email TEXT NOT NULL,
+    sent REAL NOT NULL,
+    account TEXT NOT NULL,
+    job TEXT,
+    file TEXT
+);
+CREATE INDEX IF NOT EXISTS contacts_key ON contacts (key);
+CREATE INDEX IF NOT EXISTS contacts_sent ON contacts (sent);
+CREATE INDEX IF NOT EXISTS contacts_job ON contacts (job);
+"""
+
+_INSERT = "INSERT INTO contacts (key, email, sent, account, job, file) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+def _entry(email: str, account: str, job: str | None, file: str | None) -> tuple:
+    return contact_key(email), email, time.time(), account, job, file
+
+
+def _where(email: str | None, job: str | None, account: str | None,
+           since: float | None, until: float | None) -> tuple[str, list]:
+    clauses, params = [], []
+    if email:
+        clauses.append("key = ?")
+        params.append(contact_key(email))
+    if job:
+        clauses.append("job = ?")
+        params.append(job)
+    if account:
+        clauses.append("account = ?")
+        params.append(account)
+    if since is not None:
+        clauses.append("sent >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("sent < ?")
+        params.append(until)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class ContactHistory:
+    """Every message sent, by address, across all uploaded lists and jobs, in SQLite.
+
+    ``state/history.db`` is shared by all processes serving the app. Unlike
+    the per-file 'kontaktiert' flags it outlives the uploaded copy, so a
+    re-uploaded or updated list can skip addresses contacted before.
+    """
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self._lock = threading.Lock()
+        # Entries queued by jobs, written in one transaction per step
+        self._queued: list[tuple] = []
+        self._queue_lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), timeout=10, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # Commits come once per job step or single mail; WAL with NORMAL sync keeps them cheap
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+
+    def _execute(self, sql: str, params: Iterable = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._db.execute(sql, tuple(params))
+
+    def record(self, email: str, account: str, job: str | None = None, file: str | None = None) -> None:
+        self._execute(_INSERT, _entry(email, account, job, file))
+
+    def queue(self, email: str, account: str, job: str | None = None, file: str | None = None) -> None:
+        """Like ``record``, but only written by the next ``flush``; safe to call on the event loop."""
+        with self._queue_lock:
+            self._queued.append(_entry(email, account, job, file))
+
+    def flush(self) -> None:
+        """Write the queued entries in one transaction."""
+        with self._queue_lock:
+            entries, self._queued = self._queued, []
+        if not entries:
+            return
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(_INSERT, entries)
+            except Exception:
+                self._db.execute("ROLLBACK")
+                with self._queue_lock:
+                    self._queued[:0] = entries
+                raise
+            self._db.execute("COMMIT")
+
+    def contacted(self, emails: Iterable[str], job: str | None = None) -> set[str]:
+        """Contact keys of the given addresses that were ever sent to, or sent to by ``job``, in one query."""
+        keys = [(contact_key(email),) for email in emails]
+        if not keys:
+            return set()
+        sql = "SELECT DISTINCT lookup.key FROM lookup JOIN contacts ON contacts.key = lookup.key"
+        params: tuple = ()
+        if job is not None:
+            sql += " WHERE contacts.job = ?"
+            params = (job,)
+        with self._lock:
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (key TEXT PRIMARY KEY)")
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT OR IGNORE INTO lookup (key) VALUES (?)", keys)
+                rows = self._db.execute(sql, params).fetchall()
+            finally:
+                self._db.execute("DELETE FROM lookup")
+                self._db.execute("COMMIT")
+        return {row[0] for row in rows}
+
+    def page(self, offset: int, limit: int, email: str | None = None, job: str | None = None,
+             account: str | None = None, since: float | None = None,
+             until: float | None = None) -> tuple[list[dict], int]:
+        """Newest sends first, optionally filtered. Returns (page, total matches)."""
+        where, params = _where(email, job, account, since, until)
+        total = self._execute(f"SELECT COUNT(*) FROM contacts{where}", params).fetchone()[0]
+        rows = self._execute(
+            f"SELECT {', '.join(HISTORY_COLUMNS)} FROM contacts{where} ORDER BY sent DESC LIMIT ? OFFSET ?",
+            [*params, limit, offset],
+        )
+        return [dict(row) for row in rows], total
+
+    def iter_rows(self, email: str | None = None, job: str | None = None, account: str | None = None,
+                  since: float | None = None, until: float | None = None,
+                  chunk: int = 1000) -> Iterator[tuple]:
+        """All matching sends, oldest first, fetched ``chunk`` rows at a time."""
+        where, params = _where(email, job, account, since, until)
+        last = 0
+        while True:
+            clause = f"{where} AND rowid > ?" if where else " WHERE rowid > ?"
+            rows = self._execute(
+                f"SELECT rowid, {', '.join(HISTORY_COLUMNS)} FROM contacts{clause} ORDER BY rowid LIMIT ?",
+                [*params, last, chunk],
+            ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            for row in rows:
+                yield tuple(row)[1:]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+contact_history = ContactHistory()
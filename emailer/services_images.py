@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from email.mime.image import MIMEImage
+from functools import lru_cache
+from pathlib import Path
+import hashlib
+import io
+import threading
+
+from PIL import Image, ImageOps
+
+from emailer.utils.metrics import STAGE_SECONDS
+from emailer.utils.settings import get_settings
+
+
+def sniff_subtype(data: bytes) -> str | None:
+    """MIME image subtype from the file's magic bytes, or None if unknown."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _suffix_subtype(path: Path) -> str:
+    ext = path.suffix.lower()
+    if ext in (".jpg", ".jpeg"):
+        return "jpeg"
+    if ext in (".gif", ".webp"):
+        return ext[1:]
+    return "png"
+
+
+def optimize_image(data: bytes, max_width: int, max_height: int, jpeg_quality: int) -> tuple[bytes, str]:
+    """Downscale to fit max_width x max_height and recompress.
+
+    Returns (bytes, subtype). Animated images, formats Pillow cannot read and
+    results that are not smaller than the input (even when downscaled) are
+    returned unchanged.
+    Opaque PNGs become JPEG only when that halves their size, which is true of
+    photos but not of screenshots, whose text JPEG would blur.
+    """
+    subtype = sniff_subtype(data)
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except Exception:
+        return data, subtype or "png"
+    if getattr(img, "n_frames", 1) > 1 or subtype not in ("png", "jpeg", "webp"):
+        return data, subtype or "png"
+    img = ImageOps.exif_transpose(img)
+    resized = img.width > max_width or img.height > max_height
+    if resized:
+        img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+    best = None
+    if subtype == "png" or has_alpha:
+        out = io.BytesIO()
+        img.save(out, format="PNG", optimize=True)
+        best = (out.getvalue(), "png")
+    if not has_alpha:
+        out = io.BytesIO()
+        img.convert("RGB").save(out, format="JPEG", quality=jpeg_quality, optimize=True, progressive=True)
+        if best is None or out.tell() * 2 < len(best[0]):
+            best = (out.getvalue(), "jpeg")
+    if len(best[0]) >= len(data):
+        return data, subtype
+    return best
+
+
+class ImagePartCache:
+    """LRU of base64-encoded MIME image parts keyed by content hash and options."""
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._parts: OrderedDict[tuple, MIMEImage] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> MIMEImage | None:
+        with self._lock:
+            part = self._parts.get(key)
+            if part is not None:
+                self._parts.move_to_end(key)
+            return part
+
+    def put(self, key: tuple, part: MIMEImage) -> None:
+        with self._lock:
+            self._parts[key] = part
+            self._parts.move_to_end(key)
+            while len(self._parts) > self.maxsize:
+                self._parts.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._parts.clear()
+
+
+image_part_cache = ImagePartCache()
+
+
+@lru_cache(maxsize=256)
+def _content_hash(path: str, mtime_ns: int, size: int) -> str:
+    # Uploads are named by hash already, older ones are not; hash once per file version
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def image_part(image_path: Path, cid: str) -> MIMEImage:
+    """Inline MIME part for an uploaded image, optimized and encoded once per content."""
+    opts = get_settings().images
+    st = image_path.stat()
+    key = (
+        _content_hash(str(image_path), st.st_mtime_ns, st.st_size),
+        cid,
+        image_path.stem,
+        opts.optimize,
+        opts.max_width,
+        opts.max_height,
+        opts.jpeg_quality,
+    )
+    part = image_part_cache.get(key)
+    if part is not None:
+        return part
+    data = image_path.read_bytes()
+    if opts.optimize:
+        with STAGE_SECONDS.time("optimize_image"):
+            data, subtype = optimize_image(data, opts.max_width, opts.max_height, opts.jpeg_quality)
+    else:
+        subtype = sniff_subtype(data) or _suffix_subtype(image_path)
+    part = MIMEImage(data, _subtype=subtype)
+    part.add_header('Content-ID', f'<{cid}>')
+    ext = "jpg" if subtype == "jpeg" else subtype
+    part.add_header('Content-Disposition', 'inline', filename=f"{image_path.stem}.{ext}")
+    image_part_cache.maxsize = opts.cache_size
+    image_part_cache.put(key, part)
+    return part
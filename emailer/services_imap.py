@@ -0,0 +1,141 @@
+from datetime import date, timedelta
+from email import message_from_bytes, policy
+from typing import Callable
+import asyncio
+import imaplib
+import re
+
+from emailer.services_mail import configured_accounts
+from emailer.services_suppression import SuppressionList, suppression_list
+from emailer.utils.bounces import parse_suppressions
+from emailer.utils.metrics import STAGE_SECONDS
+from emailer.utils.settings import get_mail_settings
+
+
+# Messages fetched per FETCH command; the watermark advances after each chunk
+FETCH_CHUNK = 50
+
+_UID_RE = re.compile(rb"UID (\d+)")
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def _imap_date(day: date) -> str:
+    # IMAP dates use English month names regardless of locale
+    return f"{day.day}-{_MONTHS[day.month - 1]}-{day.year}"
+
+
+def _connect() -> imaplib.IMAP4:
+    settings = get_mail_settings()
+    cls = imaplib.IMAP4_SSL if settings.imap_ssl else imaplib.IMAP4
+    return cls(settings.imap_host, settings.imap_port, timeout=settings.imap_timeout)
+
+
+def _response_number(imap: imaplib.IMAP4, name: str) -> int | None:
+    _, data = imap.response(name)
+    try:
+        return int(data[0])
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _check(result: tuple[str, list]) -> list:
+    typ, data = result
+    if typ != "OK":
+        raise imaplib.IMAP4.error(f"{typ} {data!r}")
+    return data
+
+
+def _fetched_messages(data: list) -> list[tuple[int, bytes]]:
+    """(UID, raw message) pairs from a UID FETCH response."""
+    messages = []
+    for item in data:
+        if isinstance(item, tuple) and len(item) == 2:
+            match = _UID_RE.search(item[0])
+            if match:
+                messages.append((int(match.group(1)), item[1]))
+    return messages
+
+
+def sync_account(
+    account, store: SuppressionList = suppression_list, connect: Callable[[], imaplib.IMAP4] = _connect
+) -> int:
+    """Read new mail of one account and suppress the addresses it bounces or unsubscribes. Returns the count added.
+
+    Only messages above the stored UID watermark are fetched. When the
+    mailbox's UIDVALIDITY changes, the server has renumbered it and the
+    mailbox is read again from the start (limited to ``imap_initial_days``).
+    ``connect`` opens the (not yet logged in) IMAP connection.
+    """
+    settings = get_mail_settings()
+    mailbox = settings.imap_mailbox
+    # A lock held past one interval is stale: its process died mid-sync
+    if not store.lock_mailbox(account.address, mailbox, max(settings.imap_sync_interval, settings.imap_timeout * 4)):
+        return 0
+    added = 0
+    # Campaigns Bcc their sender, so the accounts' own copies land here too
+    own_addresses = [a.address for a in configured_accounts()]
+    try:
+        with STAGE_SECONDS.time("imap_connect"):
+            imap = connect()
+        with imap:
+            _check(imap.login(account.address, account.password))
+            _check(imap.select(mailbox, readonly=True))
+            uidvalidity = _response_number(imap, "UIDVALIDITY")
+            uidnext = _response_number(imap, "UIDNEXT")
+            stored_validity, last_uid = store.watermark(account.address, mailbox)
+            if uidvalidity is None or stored_validity != uidvalidity:
+                last_uid = 0
+            criteria = ["UID", f"{last_uid + 1}:*"]
+            if last_uid == 0 and settings.imap_initial_days:
+                criteria += ["SINCE", _imap_date(date.today() - timedelta(days=settings.imap_initial_days))]
+            found = _check(imap.uid("SEARCH", *criteria))
+            # "n:*" always matches the newest message, even when its UID is below n
+            uids = sorted(uid for uid in map(int, b" ".join(found).split()) if uid > last_uid)
+            for start in range(0, len(uids), FETCH_CHUNK):
+                chunk = uids[start:start + FETCH_CHUNK]
+                with STAGE_SECONDS.time("imap_fetch"):
+                    data = _check(imap.uid("FETCH", ",".join(map(str, chunk)), "(UID BODY.PEEK[])"))
+                entries = []
+                for _, raw in _fetched_messages(data):
+                    try:
+                        message = message_from_bytes(raw, policy=policy.default)
+                        entries.extend(parse_suppressions(message, own_addresses))
+                    except Exception as exc:
+                        print(f"Could not parse a message in {account.address}/{mailbox}: {exc!r}")
+                added += store.add(entries, source=f"imap:{account.address}")
+                last_uid = chunk[-1]
+                store.set_watermark(account.address, mailbox, uidvalidity or 0, last_uid)
+            if uidnext and uidvalidity is not None:
+                # Everything below UIDNEXT has been seen now, including mail skipped by SINCE
+                store.set_watermark(account.address, mailbox, uidvalidity, max(last_uid, uidnext - 1))
+    finally:
+        store.unlock_mailbox(account.address, mailbox)
+    return added
+
+
+async def sync_suppressions() -> dict[str, str]:
+    """Sync all configured accounts concurrently. Returns map address->"+<n>" or error string."""
+    accounts = configured_accounts()
+
+    async def sync(account) -> str:
+        try:
+            return f"+{await asyncio.to_thread(sync_account, account)}"
+        except Exception as exc:
+            return f"error: {exc!r}"
+
+    statuses = await asyncio.gather(*(sync(account) for account in accounts))
+    return {account.address: status for account, status in zip(accounts, statuses)}
+
+
+async def run_suppression_sync() -> None:
+    """Sync every ``imap_sync_interval`` seconds for as long as the app runs."""
+    while True:
+        interval = get_mail_settings().imap_sync_interval
+        if interval <= 0:
+            # Disabled; check again in case the config is changed
+            await asyncio.sleep(60)
+            continue
+        for address, status in (await sync_suppressions()).items():
+            if status.startswith("error"):
+                print(f"IMAP sync for {address} failed: {status}")
+        await asyncio.sleep(interval)
@@ -1,115 +1,195 @@
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import Awaitable, Callable, Iterable, Iterator, Sequence
 import asyncio
+import functools
+import heapq
+import itertools
+import math
+import random
+import time
 import uuid
-import json
 from fastapi import HTTPException
 
-from emailer.schemas import BulkJobRequest, SendMailRequest
-from emailer.services_mail import resolve_account, build_message, send_via_smtp
-from emailer.utils.settings import get_settings, now_berlin
-from emailer.paths import EXCEL_DIR, JOBS_DIR
-import openpyxl
+from emailer.schemas import BulkJobRequest
+from emailer.services_mail import MergedMessage, PreparedMessage, deliver, inline_images, resolve_account
+from emailer.services_merge import MergeColumns, MergeTemplate, cell_text, column_name
+from emailer.utils.settings import get_settings, now_berlin, on_settings_reload
+from emailer.services_contacts import contact_state
+from emailer.utils.tables import header_index, is_true_flag, iter_table_rows
+from emailer.services_journal import FAILURE_KEY, JobJournal, PROGRESS_FIELDS, RETRY_KEY
+from emailer.services_smtp import RawMessage, classify_failure
+from emailer.services_suppression import suppression_list
+from emailer.services_history import contact_history
+from emailer.services_pacing import PacingPlanner, account_calendar
+from emailer.services_outbox import (
+    CUR, FAILED as FAILED_FOLDER, INTERRUPTED, NEW, SENT as SENT_FOLDER, Outbox, delete_outbox,
+)
+from emailer.services_leases import JobLeases
+from emailer.utils.addresses import contact_key, normalize_email
+from emailer.utils.packed import PackedStrings, write_packed
+from emailer.paths import EXCEL_DIR, JOBS_DIR, OUTBOX_DIR
+from emailer.utils.metrics import (
+    JOBS, JOBS_READY, JOBS_SCHEDULED, MESSAGES_DEFERRED, MESSAGES_FAILED, MESSAGES_SENT, STAGE_SECONDS,
+    failure_code, registry,
+)
+
+
+# Rejected rows returned by /start-bulk; the count covers all of them
+REJECTED_REPORT_LIMIT = 1000
+
+# Outcomes of one send attempt, and the outbox folder each one moves the message to
+SENT, RETRY, FAILED = "sent", "retry", "failed"
+OUTCOME_FOLDERS = {SENT: SENT_FOLDER, RETRY: NEW, FAILED: FAILED_FOLDER}
+
+# Statuses after which a job is handed back to the shared table
+FINISHED_STATUSES = ("completed", "spooled")
+
+# Messages rendered per step of a dry run
+DRY_RUN_CHUNK = 500
 
 
 def is_within_work_hours(now: datetime) -> bool:
-    sched = get_settings().scheduler
-    if now.weekday() not in sched.workdays:
-        return False
-    return sched.start_hour <= now.hour < sched.end_hour
+    return account_calendar().is_open(now.timestamp())
 
 
 def next_allowed_time(now: datetime) -> datetime:
-    sched = get_settings().scheduler
-    if now.weekday() in sched.workdays and sched.start_hour <= now.hour < sched.end_hour:
-        return now
-    day = now
-    while True:
-        day = day + timedelta(days=1)
-        if day.weekday() in sched.workdays:
-            return day.replace(hour=sched.start_hour, minute=0, second=0, microsecond=0)
-
-
-def ensure_kontaktiert_column(ws) -> int:
-    max_col = ws.max_column or 1
-    header_row = 1
-    kontakt_col = None
-    for c in range(1, max_col + 1):
-        val = ws.cell(row=header_row, column=c).value
-        if isinstance(val, str) and val.strip().lower() == "kontaktiert":
-            kontakt_col = c
-            break
-    if kontakt_col is None:
-        kontakt_col = max_col + 1
-        ws.cell(row=header_row, column=kontakt_col, value="kontaktiert")
-    return kontakt_col
+    return datetime.fromtimestamp(account_calendar().next_open(now.timestamp()), now.tzinfo)
 
 
-def load_recipients_from_excel(file_name: str) -> list[str]:
-    path = EXCEL_DIR / file_name
-    if not path.exists():
-        raise HTTPException(status_code=404, detail="file not found")
-    wb = openpyxl.load_workbook(path)
-    ws = wb.active
-    kontakt_col = ensure_kontaktiert_column(ws)
-    # find 'email' header column
-    email_col = None
-    for c in range(1, (ws.max_column or 1) + 1):
-        val = ws.cell(row=1, column=c).value
-        if isinstance(val, str) and val.strip().lower() == "email":
-            email_col = c
-            break
-    if email_col is None:
-        raise HTTPException(status_code=400, detail="Missing required 'email' column in Excel header")
-    # collect emails from the 'email' column where kontaktiert is not True
-    emails: list[str] = []
-    for r in range(2, ws.max_row + 1):
-        cell_val = ws.cell(row=r, column=email_col).value
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait before the next send after ``attempts`` transient failures, with 10% jitter."""
+    retry = get_settings().retry
+    delay = min(retry.max_delay, retry.base_delay * 2 ** (attempts - 1))
+    return delay * random.uniform(0.9, 1.1)
+
+
+def _iter_uncontacted(header: tuple, rows: Iterator[tuple], state) -> Iterator[tuple[int, str, tuple]]:
+    """(row number, raw address, row) of rows not flagged in the file or the contact state."""
+    email_idx = header_index(header, "email")
+    if email_idx is None:
+        raise HTTPException(status_code=400, detail="Missing required 'email' column in header")
+    kontakt_idx = header_index(header, "kontaktiert")
+    for row_number, row in enumerate(rows, start=2):
+        cell_val = row[email_idx] if email_idx < len(row) else None
         email = cell_val.strip() if isinstance(cell_val, str) else None
         if not email:
             continue
-        k_val = ws.cell(row=r, column=kontakt_col).value
-        if not (isinstance(k_val, bool) and k_val is True):
-            emails.append(email)
-    # persist header addition if newly added
-    wb.save(path)
-    # de-duplicate preserving order
-    seen = set()
-    result = []
-    for e in emails:
-        if e not in seen:
-            seen.add(e)
-            result.append(e)
-    return result
+        if kontakt_idx is not None and kontakt_idx < len(row) and is_true_flag(row[kontakt_idx]):
+            continue
+        if state.is_contacted(email):
+            continue
+        yield row_number, email, row
+
+
+def _merge_positions(header: tuple, fields: Iterable[str]) -> list[int]:
+    """Column index of each placeholder; raises HTTPException 400 for placeholders without a column."""
+    names = [column_name(value) for value in header]
+    missing = sorted(set(fields) - set(names))
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown placeholder(s): {', '.join(missing)}. Columns: {', '.join(n for n in names if n)}",
+        )
+    return [names.index(field) for field in fields]
+
+
+def scan_recipients(file_name: str, fields: Iterable[str] = (), skip_contacted: bool = True) -> dict:
+    """Validate and normalize the not-yet-contacted addresses of an uploaded list in one pass.
+
+    Returns the clean, case-insensitively de-duplicated ``recipients``, the
+    first REJECTED_REPORT_LIMIT ``rejected`` rows (row, email, reason), the
+    ``rejected_count``, the number of ``duplicates`` dropped and the number
+    of ``suppressed`` addresses (bounced or unsubscribed) left out. With
+    ``skip_contacted``, addresses found in the contact history from any
+    earlier list or job are left out as well (``previously_contacted``).
+    With placeholder ``fields``, ``merge`` holds their values for each
+    recipient (MergeColumns), else None. The file is only read here; the
+    'kontaktiert' column goes into a copy on first write-back, which is read
+    instead from then on.
+    """
+    if not (EXCEL_DIR / file_name).exists():
+        raise HTTPException(status_code=404, detail="file not found")
+    state = contact_state(file_name)
+    suppression_list.refresh()
+    rows = iter_table_rows(state.table_path())
+    try:
+        header = next(rows, None) or ()
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Text file is neither UTF-8 nor Windows-1252 encoded")
+    fields = sorted(fields)
+    positions = _merge_positions(header, fields) if fields else []
+    merge = MergeColumns(fields) if fields else None
+    candidates: list[tuple[str, list[str] | None]] = []
+    rejected: list[dict] = []
+    rejected_count = duplicates = suppressed = previously_contacted = 0
+    seen: set[str] = set()
+    for row_number, raw, row in _iter_uncontacted(header, rows, state):
+        try:
+            address = normalize_email(raw)
+        except ValueError as exc:
+            rejected_count += 1
+            if len(rejected) < REJECTED_REPORT_LIMIT:
+                rejected.append({"row": row_number, "email": raw, "reason": str(exc)})
+            continue
+        key = contact_key(address)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        if address in suppression_list:
+            suppressed += 1
+            continue
+        values = [cell_text(row[i]) if i < len(row) else "" for i in positions] if merge is not None else None
+        candidates.append((address, values))
+    # One lookup for the whole list rather than a query per row
+    history = contact_history.contacted(address for address, _ in candidates) if skip_contacted else set()
+    recipients: list[str] = []
+    for address, values in candidates:
+        if history and contact_key(address) in history:
+            previously_contacted += 1
+            continue
+        recipients.append(address)
+        if merge is not None:
+            merge.append(values)
+    return {
+        "recipients": recipients,
+        "rejected": rejected,
+        "rejected_count": rejected_count,
+        "duplicates": duplicates,
+        "suppressed": suppressed,
+        "previously_contacted": previously_contacted,
+        "merge": merge,
+    }
+
+
+def load_recipients_from_excel(file_name: str) -> list[str]:
+    """Valid, normalized, not-yet-contacted addresses from an uploaded .xlsx/.xlsm/.csv/.tsv file."""
+    return scan_recipients(file_name)["recipients"]
 
 
 def mark_contacted(file_name: str, email: str) -> None:
-    path = EXCEL_DIR / file_name
-    if not path.exists():
-        return
-    wb = openpyxl.load_workbook(path)
-    ws = wb.active
-    kontakt_col = ensure_kontaktiert_column(ws)
-    # find 'email' column
-    email_col = None
-    for c in range(1, (ws.max_column or 1) + 1):
-        val = ws.cell(row=1, column=c).value
-        if isinstance(val, str) and val.strip().lower() == "email":
-            email_col = c
-            break
-    if email_col is None:
-        wb.save(path)
-        return
-    target = (email or "").strip().lower()
-    for r in range(2, ws.max_row + 1):
-        val = ws.cell(row=r, column=email_col).value
-        if isinstance(val, str) and val.strip().lower() == target:
-            ws.cell(row=r, column=kontakt_col, value=True)
-            break
-    wb.save(path)
-
-
-def _job_path(job_id: str):
-    return JOBS_DIR / f"{job_id}.json"
+    """Record a successful send in memory; the sidecar and workbook are written in batches."""
+    contact_state(file_name).mark(email)
+
+
+def pack_job_strings(
+    journal: JobJournal, recipients: Sequence[str], merge: MergeColumns | None
+) -> tuple[PackedStrings, MergeColumns | None]:
+    """Write a job's recipients and placeholder values to its packed files and map them back in."""
+    write_packed(journal.recipients_path, recipients)
+    packed = PackedStrings(journal.recipients_path)
+    if merge is None:
+        return packed, None
+    write_packed(journal.merge_path, itertools.chain.from_iterable(merge.values))
+    return packed, MergeColumns.from_table(merge.columns, PackedStrings(journal.merge_path), len(packed))
+
+
+def _close_strings(job: dict) -> None:
+    """Unmap a dropped job's packed files."""
+    if isinstance(job["recipients"], PackedStrings):
+        job["recipients"].close()
+    if job["merge"] is not None and job["merge"].values and isinstance(job["merge"].values[0], PackedStrings):
+        job["merge"].values[0].close()
 
 
 def _serialize_request(req: BulkJobRequest) -> dict:
@@ -120,6 +200,11 @@ def _serialize_request(req: BulkJobRequest) -> dict:
         "batch_size": req.batch_size,
         "interval_minutes": req.interval_minutes,
         "file_id": req.file_id,
+        "accounts": req.accounts,
+        "skip_contacted": req.skip_contacted,
+        "send_until": req.send_until.isoformat() if req.send_until else None,
+        "per_hour": req.per_hour,
+        "dry_run": req.dry_run,
     }
 
 
@@ -127,15 +212,66 @@ def _deserialize_request(data: dict) -> BulkJobRequest:
     return BulkJobRequest(**data)
 
 
+class ProgressSubscription:
+    """Job updates for one stream client, coalesced to the latest state per job."""
+
+    def __init__(self):
+        self._pending: dict[str, dict] = {}
+        self._event = asyncio.Event()
+
+    def push(self, update: dict) -> None:
+        self._pending[update["id"]] = update
+        self._event.set()
+
+    async def next(self, timeout: float) -> list[dict]:
+        """Wait up to ``timeout`` seconds and return the updates gathered so far."""
+        try:
+            async with asyncio.timeout(timeout):
+                await self._event.wait()
+        except TimeoutError:
+            return []
+        self._event.clear()
+        updates, self._pending = list(self._pending.values()), {}
+        return updates
+
+
 class JobManager:
     def __init__(self):
         self.jobs: dict[str, dict] = {}
+        self.journals: dict[str, JobJournal] = {}
+        self.outboxes: dict[str, Outbox] = {}
+        # Per-job task rendering messages into the outbox ahead of delivery
+        self._producers: dict[str, asyncio.Task] = {}
+        # Per-job message serialized once and re-addressed for each recipient
+        self.prepared: dict[str, list[PreparedMessage]] = {}
+        # Min-heap of (due timestamp, seq, job_id); entries not matching self._due are stale
+        self._heap: list[tuple[float, int, str]] = []
+        self._due: dict[str, float] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._ready: asyncio.Queue[str] = asyncio.Queue()
+        self._running: dict[str, asyncio.Task] = {}
+        # Per-job worker threads reading the job and sends handed to the SMTP server;
+        # cancelling their caller does not stop them
+        self._threads: dict[str, set[asyncio.Future]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._subscribers: set[ProgressSubscription] = set()
+        self.pacing = PacingPlanner()
+        # Shared with the other processes serving the app; jobs is only what this one owns
+        self.leases = JobLeases()
+        self._foreign_since = time.time()
+        on_settings_reload(self._on_settings_reload)
+        registry.on_collect(self._collect_metrics)
 
-    async def add_job(self, recipients: list[str], req: BulkJobRequest) -> str:
+    async def add_job(self, recipients: list[str], req: BulkJobRequest, merge: MergeColumns | None = None) -> str:
         job_id = str(uuid.uuid4())
-        self.jobs[job_id] = {
+        # Kept on disk and mapped from here on; the lists can go
+        recipients, merge = await asyncio.to_thread(pack_job_strings, self._journal(job_id), recipients, merge)
+        job = {
             "id": job_id,
             "recipients": recipients,
+            "merge": merge,
             "request": req,
             "cursor": 0,
             "sent": 0,
@@ -143,17 +279,93 @@ class JobManager:
             "status": "queued",
             "next_run": now_berlin().timestamp(),
             "cancelled": False,
+            "retries": {},
+            "failures": {},
         }
+        # In the shared table before it is owned here, or the next heartbeat would take it for lost
+        await asyncio.to_thread(self.leases.create, self._public(job), self._lease_ttl())
+        self.jobs[job_id] = job
+        if not req.dry_run:
+            # A dry run sends nothing, so it takes no slots or quota share from other jobs
+            moved = self.pacing.add(job_id, job)
+            job["next_run"] = self.pacing.next_slot(job_id)
+            self._replanned(moved - {job_id})
         self._save(job_id)
-        asyncio.create_task(self._run_job(job_id))
+        self._schedule(job_id, self.jobs[job_id]["next_run"])
         return job_id
 
-    def list_jobs(self) -> list[dict]:
-        return [self._public(j) for j in self.jobs.values()]
+    async def list_jobs(
+        self, statuses: Iterable[str] | None = None, offset: int = 0, limit: int | None = None
+    ) -> tuple[list[dict], int]:
+        """Newest jobs of all processes first, optionally filtered by status. Returns (page, total matches)."""
+        rows, total = await asyncio.to_thread(self.leases.page, statuses, offset, limit)
+        # The table lags by up to one heartbeat for jobs owned here; memory is current
+        return [self._public(self.jobs[r["id"]]) if r["id"] in self.jobs else r for r in rows], total
 
     def get_job(self, job_id: str) -> dict | None:
         j = self.jobs.get(job_id)
-        return self._public(j) if j else None
+        return self._public(j) if j else self.leases.get(job_id)
+
+    def get_failures(self, job_id: str) -> dict | None:
+        """Final failures (email, reason) and the number of recipients waiting for a retry.
+
+        Reads the job's files when another process owns it, so call it off the event loop.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            if self.leases.get(job_id) is None:
+                return None
+            try:
+                _, job = self._read_job(job_id)
+            except FileNotFoundError:
+                return None
+        return {
+            "id": job_id,
+            "failures": [
+                {"email": job["recipients"][idx], "reason": reason}
+                for idx, reason in sorted(job["failures"].items())
+            ],
+            "retrying": len(job["retries"]),
+        }
+
+    def get_outbox(self, job_id: str, folder: str, offset: int, limit: int) -> dict | None:
+        """Counts per outbox folder and a page of the recipients spooled in ``folder``.
+
+        Reads the job's files when another process owns it, so call it off the event loop.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            if self.leases.get(job_id) is None:
+                return None
+            try:
+                _, job = self._read_job(job_id)
+            except FileNotFoundError:
+                return None
+        outbox = self.outboxes.get(job_id)
+        if outbox is None and (OUTBOX_DIR / job_id).is_dir():
+            outbox = Outbox(job_id)
+        indices = outbox.entries(folder) if outbox else []
+        return {
+            "id": job_id,
+            "counts": outbox.counts() if outbox else {},
+            "folder": folder,
+            "total": len(indices),
+            "messages": [{"index": idx, "email": job["recipients"][idx]} for idx in indices[offset:offset + limit]],
+        }
+
+    def outbox_message(self, job_id: str, idx: int) -> bytes | None:
+        """A spooled message as stored, envelope lines first. Reads from disk; call it off the event loop."""
+        outbox = self.outboxes.get(job_id)
+        if outbox is None:
+            if not (OUTBOX_DIR / job_id).is_dir():
+                return None
+            outbox = Outbox(job_id)
+        path = outbox.path(idx)
+        try:
+            return path.read_bytes() if path else None
+        except FileNotFoundError:
+            # Moved on to the next folder meanwhile
+            return None
 
     def _public(self, j: dict) -> dict:
         return {
@@ -163,15 +375,126 @@ class JobManager:
             "failed": j["failed"],
             "status": j["status"],
             "next_run": j.get("next_run"),
+            "planned_end": self.pacing.planned_end(j["id"]),
         }
 
+    def _collect_metrics(self) -> None:
+        counts: dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        JOBS.clear()
+        for status, count in counts.items():
+            JOBS.set(count, status)
+        JOBS_READY.set(self._ready.qsize())
+        JOBS_SCHEDULED.set(len(self._due))
+
+    def subscribe(self) -> ProgressSubscription:
+        subscription = ProgressSubscription()
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: ProgressSubscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def _publish(self, job_id: str) -> None:
+        if not self._subscribers:
+            return
+        job = self.jobs.get(job_id)
+        update = self._public(job) if job else {"id": job_id, "status": "cancelled"}
+        for subscription in self._subscribers:
+            subscription.push(update)
+
+    def _journal(self, job_id: str) -> JobJournal:
+        journal = self.journals.get(job_id)
+        if journal is None:
+            journal = self.journals[job_id] = JobJournal(job_id)
+        return journal
+
+    def _outbox(self, job_id: str) -> Outbox:
+        outbox = self.outboxes.get(job_id)
+        if outbox is None:
+            outbox = self.outboxes[job_id] = Outbox(job_id)
+        return outbox
+
+    async def _job_thread(self, job_id: str, fn: Callable, *args):
+        """Run ``fn`` in the default executor, tracked until the thread is done with the job."""
+        future = asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+        self._track(job_id, future)
+        return await asyncio.shield(future)
+
+    async def _until_handoff(self, job_id: str, send: Callable[[Callable[[], None]], Awaitable]):
+        """Run ``send(handoff)``, which calls ``handoff`` right before the message goes to the SMTP server.
+
+        Cancelling stops the send only until then. A message handed off is
+        seen through so its outcome gets recorded: the cancelled caller waits
+        for it, and it is tracked with the job's threads meanwhile.
+        """
+        handed_off = False
+
+        def handoff() -> None:
+            nonlocal handed_off
+            handed_off = True
+            self._track(job_id, task)
+
+        task = asyncio.create_task(send(handoff))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not handed_off:
+                task.cancel()
+            else:
+                await asyncio.wait({task})
+            raise
+
+    def _track(self, job_id: str, future: asyncio.Future) -> None:
+        threads = self._threads.setdefault(job_id, set())
+        threads.add(future)
+
+        def done(fut: asyncio.Future) -> None:
+            threads.discard(fut)
+            if not fut.cancelled():
+                # Retrieved here as the caller may be gone
+                fut.exception()
+
+        future.add_done_callback(done)
+
+    def _release(self, job_id: str, job: dict | None, cleanup: Callable[[], None] | None = None) -> None:
+        """Unmap a dropped job's packed files, then run ``cleanup``, once its worker threads are done.
+
+        A cancelled producer or step leaves its thread running; it stops after
+        the message at hand, but may read the recipients until then.
+        """
+        if job is not None:
+            job["stopping"] = True
+        threads = self._threads.pop(job_id, ())
+
+        def close(_=None) -> None:
+            if job is not None:
+                _close_strings(job)
+            if cleanup is not None:
+                cleanup()
+
+        if threads:
+            asyncio.gather(*threads, return_exceptions=True).add_done_callback(close)
+        else:
+            close()
+
+    def _stop_producer(self, job_id: str) -> None:
+        producer = self._producers.pop(job_id, None)
+        if producer is not None:
+            producer.cancel()
+
     def _save(self, job_id: str):
+        """Write a full snapshot of the job, folding in its journal."""
         job = self.jobs.get(job_id)
         if not job:
             return
+        if not isinstance(job["recipients"], PackedStrings):
+            # Loaded from a snapshot written before recipients were packed
+            job["recipients"], job["merge"] = pack_job_strings(self._journal(job_id), job["recipients"], job["merge"])
         data = {
             "id": job["id"],
-            "recipients": job["recipients"],
+            "merge": {"columns": job["merge"].columns} if job["merge"] else None,
             "request": _serialize_request(job["request"]),
             "cursor": job["cursor"],
             "sent": job["sent"],
@@ -179,117 +502,683 @@ class JobManager:
             "status": job["status"],
             "next_run": job.get("next_run"),
             "cancelled": job.get("cancelled", False),
+            "retries": {str(idx): entry for idx, entry in job["retries"].items()},
+            "failures": {str(idx): reason for idx, reason in job["failures"].items()},
         }
-        _job_path(job_id).write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        with STAGE_SECONDS.time("save"):
+            self._journal(job_id).write_snapshot(data)
+        self._publish(job_id)
 
-    def _delete_job_record(self, job_id: str) -> None:
-        """Remove job from memory and delete its persisted file."""
-        self.jobs.pop(job_id, None)
-        try:
-            _job_path(job_id).unlink(missing_ok=True)  # type: ignore[arg-type]
-        except Exception:
-            pass
+    def _checkpoint(self, job_id: str):
+        """Persist progress fields with a constant-size journal append."""
+        job = self.jobs.get(job_id)
+        if not job:
+            return
+        with STAGE_SECONDS.time("checkpoint"):
+            compact = self._journal(job_id).append({k: job.get(k) for k in PROGRESS_FIELDS})
+        if compact:
+            self._save(job_id)
+        else:
+            self._publish(job_id)
+
+    async def _delete_job_record(self, job_id: str) -> None:
+        """Remove job from memory and delete its persisted files."""
+        job = self.jobs.pop(job_id, None)
+        self.prepared.pop(job_id, None)
+        self._replanned(self.pacing.remove(job_id))
+        self._stop_producer(job_id)
+        registry.forget("job", job_id)
+        journal = self.journals.pop(job_id, None) or JobJournal(job_id)
+        self.outboxes.pop(job_id, None)
+
+        def delete_files() -> None:
+            try:
+                journal.delete()
+            except Exception:
+                pass
+            delete_outbox(job_id)
+
+        self._release(job_id, job, delete_files)
+        await asyncio.to_thread(self.leases.delete, job_id)
+
+    def _read_job(self, job_id: str) -> tuple[JobJournal, dict]:
+        journal = JobJournal(job_id)
+        data = journal.load()
+        if "recipients" in data:
+            # Snapshot from before packed storage; repacked on the next save
+            recipients, merge = data["recipients"], MergeColumns.from_json(data.get("merge"))
+        else:
+            recipients = PackedStrings(journal.recipients_path)
+            merge = None
+            if data.get("merge"):
+                table = PackedStrings(journal.merge_path)
+                merge = MergeColumns.from_table(data["merge"]["columns"], table, len(recipients))
+        return journal, {
+            "id": data["id"],
+            "recipients": recipients,
+            "merge": merge,
+            "request": _deserialize_request(data.get("request", {})),
+            "cursor": data.get("cursor", 0),
+            "sent": data.get("sent", 0),
+            "failed": data.get("failed", 0),
+            "status": data.get("status", "queued"),
+            "next_run": data.get("next_run"),
+            "cancelled": data.get("cancelled", False),
+            "retries": {int(idx): entry for idx, entry in data.get("retries", {}).items()},
+            "failures": {int(idx): reason for idx, reason in data.get("failures", {}).items()},
+        }
 
     def load_existing(self):
+        """Add jobs found in jobs/ that the shared job table does not know yet.
+
+        Only needed once, for job files written before the table existed, so
+        startup does not grow with the job history. Nothing is loaded into
+        memory here; unfinished jobs are picked up by whichever process claims
+        them once the scheduler runs.
+        """
+        if self.leases.imported:
+            return
+        known = self.leases.known_ids()
         for path in JOBS_DIR.glob("*.json"):
+            if path.stem in known:
+                continue
             try:
-                data = json.loads(path.read_text(encoding="utf-8"))
-                job_id = data["id"]
-                self.jobs[job_id] = {
-                    "id": job_id,
-                    "recipients": data.get("recipients", []),
-                    "request": _deserialize_request(data.get("request", {})),
-                    "cursor": data.get("cursor", 0),
-                    "sent": data.get("sent", 0),
-                    "failed": data.get("failed", 0),
-                    "status": data.get("status", "queued"),
-                    "next_run": data.get("next_run"),
-                    "cancelled": data.get("cancelled", False),
-                }
-                if self.jobs[job_id]["status"] != "completed":
-                    asyncio.create_task(self._run_job(job_id))
+                _, job = self._read_job(path.stem)
+                self.leases.register(self._public(job), path.stat().st_mtime)
             except Exception:
                 continue
+        self.leases.mark_imported()
+
+    async def _claim(self, job_id: str) -> bool:
+        """Take over an unowned job: load it from disk and schedule it."""
+        if not await asyncio.to_thread(self.leases.claim, job_id, self._lease_ttl()):
+            return False
+        try:
+            journal, job = await asyncio.to_thread(self._read_job, job_id)
+        except FileNotFoundError:
+            await asyncio.to_thread(self.leases.delete, job_id)
+            return False
+        except Exception as exc:
+            print(f"Could not load job {job_id}: {exc!r}")
+            return False
+        outbox = await asyncio.to_thread(Outbox, job_id)
+        stuck = await asyncio.to_thread(outbox.recover)
+        if stuck:
+            print(f"Job {job_id}: {len(stuck)} message(s) were mid-delivery at the last shutdown, not resending")
+        self.outboxes[job_id] = outbox
+        self.journals[job_id] = journal
+        self.jobs[job_id] = job
+        if journal.pending_records or not isinstance(job["recipients"], PackedStrings):
+            # Start from a clean snapshot so a torn journal tail is never appended to,
+            # and move recipients of older snapshots into their packed files
+            self._save(job_id)
+        # The previous owner may have sent mails it had no time to checkpoint or mark
+        await asyncio.to_thread(self._remark_sent, job, outbox)
+        if not job["request"].dry_run:
+            self._replanned(self.pacing.add(job_id, job) - {job_id})
+        self._schedule(job_id, job["next_run"])
+        return True
+
+    def _abandon(self, job_id: str) -> None:
+        """Stop working on a job whose lease was lost; its files now belong to the new owner."""
+        print(f"Lost the lease on job {job_id}")
+        self._due.pop(job_id, None)
+        running = self._running.get(job_id)
+        if running is not None:
+            running.cancel()
+        job = self.jobs.pop(job_id, None)
+        self.prepared.pop(job_id, None)
+        self.journals.pop(job_id, None)
+        self.outboxes.pop(job_id, None)
+        self._stop_producer(job_id)
+        self._replanned(self.pacing.remove(job_id))
+        registry.forget("job", job_id)
+        self._release(job_id, job)
 
-    def cancel_job(self, job_id: str) -> bool:
+    async def _finish(self, job_id: str) -> None:
+        """Hand a completed job back to the shared table and drop it from memory."""
+        job = self.jobs.pop(job_id, None)
+        self.journals.pop(job_id, None)
+        self.outboxes.pop(job_id, None)
+        self._stop_producer(job_id)
+        self._replanned(self.pacing.remove(job_id))
+        # A finished job adds no more samples; keep the per-job series bounded
+        registry.forget("job", job_id)
+        if job is not None:
+            await asyncio.to_thread(self.leases.release, self._public(job))
+        self._release(job_id, job)
+
+    async def cancel_job(self, job_id: str) -> bool:
         job = self.jobs.get(job_id)
         if not job:
-            return False
+            owned_elsewhere = await asyncio.to_thread(self.leases.mark_cancelled, job_id)
+            if owned_elsewhere is None:
+                return False
+            if not owned_elsewhere:
+                # Nobody is working on it, so clean up here; otherwise its owner does
+                await self._delete_job_record(job_id)
+            self._publish(job_id)
+            return True
         job["cancelled"] = True
-        # Remove immediately from lists and disk; running loop will observe flag and exit
-        self._delete_job_record(job_id)
+        self._due.pop(job_id, None)
+        running = self._running.get(job_id)
+        if running is not None:
+            # Abort sends still waiting for a token or slot; handed-off ones are seen through
+            running.cancel()
+        # Remove immediately from lists and disk
+        await self._delete_job_record(job_id)
+        self._publish(job_id)
+        self._wakeup.set()
         return True
 
-    async def _run_job(self, job_id: str):
+    def start(self, workers: int | None = None) -> None:
+        """Start the dispatcher and the bounded pool of send workers on the running loop."""
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        count = workers or get_settings().scheduler.max_workers
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        self._tasks.extend(asyncio.create_task(self._worker()) for _ in range(max(1, count)))
+
+    async def stop(self) -> None:
+        steps = [*self._running.values(), *self._producers.values()]
+        for job in self.jobs.values():
+            # Rendering threads give up after the message at hand, and no more sends are handed off
+            job["stopping"] = True
+        for task in [*self._tasks, *steps]:
+            task.cancel()
+        self._producers.clear()
+        self._running.clear()
+        await asyncio.gather(*self._tasks, *steps, return_exceptions=True)
+        self._tasks.clear()
+        # Nothing of this process may touch a job once another one can claim it;
+        # sends already with the server finish and move their message to sent or failed
+        threads = [future for futures in self._threads.values() for future in futures]
+        self._threads.clear()
+        await asyncio.gather(*threads, return_exceptions=True)
+        # Let other processes take over right away instead of after the lease TTL
+        owned = []
+        for job in self.jobs.values():
+            if job["status"] in ("sending", "spooling"):
+                job["status"] = "queued"
+            owned.append(self._public(job))
+
+        def release() -> None:
+            for public in owned:
+                self.leases.release(public)
+            self.leases.leave()
+
+        await asyncio.to_thread(release)
+        for job in self.jobs.values():
+            _close_strings(job)
+        self.jobs.clear()
+        self.journals.clear()
+        self.outboxes.clear()
+        self.prepared.clear()
+        self.pacing.clear()
+
+    def _lease_ttl(self) -> float:
+        return get_settings().scheduler.lease_ttl
+
+    async def _heartbeat(self) -> None:
+        """Renew leases, act on lost leases and remote cancels, and claim unowned jobs."""
+        # Jitter so processes started together do not all claim in the same instant
+        await asyncio.sleep(random.uniform(0, 0.5))
         while True:
+            ttl = self._lease_ttl()
+            try:
+                await self._sync_leases(ttl)
+            except Exception as exc:
+                print(f"Job lease heartbeat failed: {exc!r}")
+            await asyncio.sleep(ttl / 3)
+
+    async def _sync_leases(self, ttl: float) -> None:
+        owned = [self._public(j) for j in self.jobs.values()]
+        lost, cancelled, workers = await asyncio.to_thread(self.leases.heartbeat, owned, ttl)
+        for job_id in lost:
+            self._abandon(job_id)
+        for job_id in cancelled:
+            await self.cancel_job(job_id)
+        claimable = await asyncio.to_thread(self.leases.claimable)
+        # Take an even share per beat so orphaned jobs spread over the live processes
+        share = math.ceil(len(claimable) / max(1, workers))
+        random.shuffle(claimable)
+        for job_id in claimable:
+            if share <= 0:
+                break
+            if await self._claim(job_id):
+                share -= 1
+        if self._subscribers:
+            since, self._foreign_since = self._foreign_since, time.time()
+            for update in await asyncio.to_thread(self.leases.updated_since, since):
+                for subscription in self._subscribers:
+                    subscription.push(update)
+
+    def _schedule(self, job_id: str, ts: float | None) -> None:
+        due = ts if isinstance(ts, (int, float)) else now_berlin().timestamp()
+        self._due[job_id] = due
+        heapq.heappush(self._heap, (due, next(self._seq), job_id))
+        self._wakeup.set()
+
+    def _on_settings_reload(self, settings) -> None:
+        # May run on a worker thread; calendars, quotas and accounts may have changed
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._replan_all)
+
+    def _replan_all(self) -> None:
+        self._replanned(self.pacing.replan_all())
+        for job_id, job in self.jobs.items():
+            if job["status"] == "retrying" and job_id in self._due:
+                # Parked until a window of the old calendar; the next step finds the new one
+                self._schedule(job_id, None)
+
+    def _replanned(self, job_ids: Iterable[str]) -> None:
+        """Move parked jobs to their next slot after their pacing plan changed."""
+        for job_id in job_ids:
             job = self.jobs.get(job_id)
-            if not job:
-                return
+            if job is None or job_id not in self._due or job["status"] not in ("queued", "sleeping", "waiting_window"):
+                continue
+            job["next_run"] = self.pacing.next_slot(job_id)
+            self._schedule(job_id, job["next_run"])
+            self._publish(job_id)
+
+    async def _dispatch(self) -> None:
+        """Move due jobs from the heap to the worker queue; sleeps until the next due time."""
+        while True:
+            self._wakeup.clear()
+            now = now_berlin().timestamp()
+            while self._heap and self._heap[0][0] <= now:
+                due, _, job_id = heapq.heappop(self._heap)
+                if self._due.get(job_id) != due:
+                    continue  # rescheduled or cancelled since it was pushed
+                del self._due[job_id]
+                self._ready.put_nowait(job_id)
+            # A timer sets the same event as add/cancel/reload, so one wait covers both
+            timer = None
+            if self._heap:
+                timer = asyncio.get_running_loop().call_later(self._heap[0][0] - now, self._wakeup.set)
+            try:
+                await self._wakeup.wait()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._ready.get()
+            job = self.jobs.get(job_id)
+            if not job or job.get("cancelled"):
+                continue
+            file_id = job["request"].file_id
+            step = asyncio.create_task(self._run_step(job_id))
+            self._running[job_id] = step
+            # wait() instead of await so cancelling the step does not cancel the worker
+            await asyncio.wait({step})
+            self._running.pop(job_id, None)
+            next_run = None
+            if not step.cancelled():
+                if step.exception() is not None:
+                    print(f"Job {job_id} step failed: {step.exception()!r}")
+                    next_run = now_berlin().timestamp() + 60
+                else:
+                    next_run = step.result()
+            if next_run is not None and job_id in self.jobs:
+                self._schedule(job_id, next_run)
+            else:
+                # Job completed or cancelled: drop caches and write back what was sent
+                self.prepared.pop(job_id, None)
+                if job_id in self.jobs and self.jobs[job_id]["status"] in FINISHED_STATUSES:
+                    if not get_settings().outbox.keep_sent:
+                        await asyncio.to_thread(self._outbox(job_id).prune_sent, len(job["recipients"]))
+                    await self._finish(job_id)
+                await asyncio.to_thread(contact_history.flush)
+                with STAGE_SECONDS.time("flush_contacts"):
+                    await asyncio.to_thread(contact_state(file_id).flush)
+
+    async def _run_step(self, job_id: str) -> float | None:
+        """Send the messages whose slots are due. Returns when to run again, or None when the job is done."""
+        job = self.jobs.get(job_id)
+        if not job or job.get("cancelled"):
+            return None
+        if job["request"].dry_run:
+            await self._spool_all(job_id, job, job["request"])
+            return None
+        if job["cursor"] >= len(job["recipients"]) and not job["retries"]:
+            job["status"] = "completed"
+            self._save(job_id)
+            return None
+        now_ts = now_berlin().timestamp()
+        calendar = self.pacing.calendar(job_id)
+        if not calendar.is_open(now_ts):
+            job["status"] = "waiting_window"
+            job["next_run"] = calendar.next_open(now_ts)
+            self._checkpoint(job_id)
+            return job["next_run"]
+        due_retries = sorted(idx for idx, (_, due) in job["retries"].items() if due <= now_ts)
+        if not due_retries and job["cursor"] >= len(job["recipients"]):
+            return self._park_retrying(job_id, job, calendar)
+        req: BulkJobRequest = job["request"]
+        # More than one slot is due only when they are closer together than a step takes
+        slots = self.pacing.take(job_id, now_ts, max(1, req.batch_size))
+        if not slots:
+            job["status"] = "sleeping"
+            job["next_run"] = self.pacing.next_slot(job_id)
+            self._checkpoint(job_id)
+            return job["next_run"]
+        contacts = contact_state(req.file_id)
+        # Bounces and unsubscribes may have come in since the job was created
+        await asyncio.to_thread(suppression_list.refresh)
+        # Due retries go first and take up slots like first attempts, so pacing holds
+        retries = due_retries[:slots]
+        start = job["cursor"]
+        end = min(start + slots - len(retries), len(job["recipients"]))
+        job["status"] = "sending"
+        self._publish(job_id)
+        with STAGE_SECONDS.time("batch"):
+            await self._send_batch(job_id, job, req, retries, start, end, contacts)
+        if job.get("cancelled"):
+            return None
+        # This step's contacted marks reach the sidecar before its sent messages are pruned
+        await asyncio.to_thread(contacts.sync)
+        await asyncio.to_thread(contact_history.flush)
+        if not get_settings().outbox.keep_sent:
+            # Past the saved cursor a delivered message is never looked at again
+            await asyncio.to_thread(self._outbox(job_id).prune_sent, job["cursor"])
+        if contacts.flush_due():
+            # Flags are safe in the sidecar; the workbook is rewritten at most every flush_interval
+            with STAGE_SECONDS.time("flush_contacts"):
+                await asyncio.to_thread(contacts.flush)
+        if job["cursor"] < len(job["recipients"]):
+            job["status"] = "sleeping"
+            job["next_run"] = self.pacing.next_slot(job_id)
+            self._checkpoint(job_id)
+            return job["next_run"]
+        if job["retries"]:
+            return self._park_retrying(job_id, job, calendar)
+        job["status"] = "completed"
+        self._save(job_id)
+        return None
+
+    async def _spool_all(self, job_id: str, job: dict, req: BulkJobRequest) -> None:
+        """Dry run: render every message into the outbox for inspection, sending nothing."""
+        prepared = await self._prepared_messages(job_id, job, req)
+        outbox = self._outbox(job_id)
+        job["status"] = "spooling"
+        self._publish(job_id)
+        while job["cursor"] < len(job["recipients"]):
+            end = min(job["cursor"] + DRY_RUN_CHUNK, len(job["recipients"]))
+            indices = [idx for idx in range(job["cursor"], end) if outbox.state(idx) is None]
+            messages = await self._job_thread(job_id, self._spool, job, prepared, outbox, indices)
             if job.get("cancelled"):
-                self._delete_job_record(job_id)
                 return
-            if job["cursor"] >= len(job["recipients"]):
-                job["status"] = "completed"
-                self._save(job_id)
+            for idx, message in messages.items():
+                if isinstance(message, str):
+                    self._record_outcome(job_id, job, idx, (FAILED, message))
+            job["cursor"] = end
+            self._checkpoint(job_id)
+        job["status"] = "spooled"
+        self._save(job_id)
+
+    def _park_retrying(self, job_id: str, job: dict, calendar) -> float:
+        """Only retries left: sleep until the first is due and a slot is free, within work hours."""
+        job["status"] = "retrying"
+        first_due = min(due for _, due in job["retries"].values())
+        job["next_run"] = calendar.next_open(max(first_due, self.pacing.next_slot(job_id), time.time()))
+        self._checkpoint(job_id)
+        return job["next_run"]
+
+    def _record_outcome(self, job_id: str, job: dict, idx: int, outcome: tuple[str, str]) -> None:
+        """Count one recipient's send attempt, queueing a retry or recording a final failure."""
+        status, reason = outcome
+        journal = self._journal(job_id)
+        if status == SENT:
+            job["sent"] += 1
+            if job["retries"].pop(idx, None) is not None:
+                journal.append({RETRY_KEY: [idx]})
+            return
+        if status == RETRY:
+            attempts = job["retries"].get(idx, [0])[0] + 1
+            if attempts < get_settings().retry.max_attempts:
+                entry = job["retries"][idx] = [attempts, time.time() + retry_delay(attempts)]
+                journal.append({RETRY_KEY: [idx, *entry]})
                 return
-            now = now_berlin()
-            # If a next_run is scheduled in the future, wait until then (survives restarts)
-            next_run_ts = job.get("next_run")
-            if isinstance(next_run_ts, (int, float)):
-                now_ts = now.timestamp()
-                if now_ts < next_run_ts - 0.001:
-                    job["status"] = "sleeping"
-                    self._save(job_id)
-                    await asyncio.sleep(max(0, next_run_ts - now_ts))
-                    continue
-            if not is_within_work_hours(now):
-                wake = next_allowed_time(now)
-                job["status"] = "waiting_window"
-                job["next_run"] = wake.timestamp()
-                self._save(job_id)
-                await asyncio.sleep(max(0, (wake - now).total_seconds()))
-                continue
-            req: BulkJobRequest = job["request"]
-            start = job["cursor"]
-            end = min(start + max(1, req.batch_size), len(job["recipients"]))
-            recipients = job["recipients"][start:end]
-            job["status"] = "sending"
-            for r in recipients:
+            reason = f"{reason} (gave up after {attempts} attempts)"
+        job["failed"] += 1
+        job["retries"].pop(idx, None)
+        job["failures"][idx] = reason
+        journal.append({FAILURE_KEY: [idx, reason]})
+
+    async def _send_batch(
+        self, job_id: str, job: dict, req: BulkJobRequest, retries: list[int], start: int, end: int, contacts
+    ):
+        """Send the queued ``retries`` and recipients[start:end] concurrently, bounded per account.
+
+        Sends may finish out of order; first attempts are only counted as the
+        cursor advances over a contiguous prefix, so each recipient is counted
+        exactly once and a restart resumes at the cursor. Retries all lie
+        behind the cursor and are counted as they finish. Messages come from
+        the job's outbox; the ones after this batch are rendered into it while
+        this batch is being delivered.
+        """
+        prepared = await self._prepared_messages(job_id, job, req)
+        outbox = self._outbox(job_id)
+        producer = self._producers.get(job_id)
+        if producer is not None:
+            # Let the messages rendered ahead land before taking them
+            await asyncio.wait({producer})
+        indices = [*retries, *range(start, end)]
+        messages = await self._job_thread(job_id, self._take_spooled, job, prepared, outbox, indices)
+        self._spool_ahead(job_id, job, prepared, end)
+        results: dict[int, tuple[str, str]] = {}
+        retrying = set(retries)
+
+        async def send(idx: int) -> tuple[int, tuple[str, str]]:
+            message = messages[idx]
+            if job.get("cancelled"):
+                return idx, (RETRY, "cancelled")
+            if isinstance(message, tuple):
+                # Settled before a restart; only the count is missing
+                return idx, message
+            if isinstance(message, str):
+                return idx, (FAILED, message)
+            account, recipient = prepared[idx % len(prepared)].account, job["recipients"][idx]
+
+            async def deliver_one(handoff: Callable[[], None]) -> tuple[str, str]:
+                def to_cur() -> None:
+                    if job.get("cancelled") or job.get("stopping"):
+                        # Cancelled while waiting for a token or slot; nothing has gone out
+                        raise asyncio.CancelledError
+                    handoff()
+                    outbox.move(idx, CUR)
+
+                outcome = await self._send_one(job_id, account, message, req, recipient, to_cur)
+                # Part of the handed-off send, so a delivered message always ends up in sent and marked
+                outbox.move(idx, OUTCOME_FOLDERS[outcome[0]])
+                return outcome
+
+            return idx, await self._until_handoff(job_id, deliver_one)
+
+        tasks = [asyncio.create_task(send(idx)) for idx in indices]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                idx, outcome = await fut
                 if job.get("cancelled"):
-                    self._delete_job_record(job_id)
                     return
-                ok = await self._send_one(req, r)
-                if ok:
-                    job["sent"] += 1
-                else:
-                    job["failed"] += 1
-                job["cursor"] += 1
-                self._save(job_id)
-            if job["cursor"] < len(job["recipients"]):
-                job["status"] = "sleeping"
-                wake = now + timedelta(minutes=max(0, req.interval_minutes))
-                job["next_run"] = wake.timestamp()
-                self._save(job_id)
-                await asyncio.sleep(max(0, req.interval_minutes) * 60)
+                if idx in retrying:
+                    self._record_outcome(job_id, job, idx, outcome)
+                    self._checkpoint(job_id)
+                    continue
+                results[idx] = outcome
+                advanced = False
+                while job["cursor"] in results:
+                    self._record_outcome(job_id, job, job["cursor"], results.pop(job["cursor"]))
+                    job["cursor"] += 1
+                    advanced = True
+                if advanced:
+                    self._checkpoint(job_id)
+                if contacts.flush_due():
+                    with STAGE_SECONDS.time("flush_contacts"):
+                        await asyncio.to_thread(contacts.flush)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Sends the server already has are recorded before the step ends
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _prepared_messages(
+        self, job_id: str, job: dict, req: BulkJobRequest
+    ) -> list[PreparedMessage] | list[MergedMessage]:
+        prepared = self.prepared.get(job_id)
+        if prepared is None:
+            addresses = req.accounts or [req.from_address]
+            with STAGE_SECONDS.time("resolve_account"):
+                accounts = [resolve_account(address) for address in addresses]
+
+            def build():
+                if job["merge"] is None:
+                    return [PreparedMessage(account, req.html_body, req.betreff) for account in accounts]
+                # One compiled template shared by the skeletons of all sender accounts
+                html_body, image_paths = inline_images(req.html_body)
+                template = MergeTemplate(html_body, req.betreff)
+                return [MergedMessage(account, template, image_paths) for account in accounts]
+
+            # Building may optimize inline images on first use; keep that off the event loop
+            prepared = self.prepared[job_id] = await asyncio.to_thread(build)
+        return prepared
+
+    def _spool_ahead(self, job_id: str, job: dict, prepared: list, start: int) -> None:
+        """Render the next ``[outbox] ahead`` messages from ``start`` on into the outbox, in the background."""
+        if job_id in self._producers:
+            return
+        ahead = get_settings().outbox.ahead
+        outbox = self._outbox(job_id)
+        indices = [
+            idx for idx in range(start, min(start + ahead, len(job["recipients"])))
+            if outbox.state(idx) is None
+        ]
+        if not indices:
+            return
+        producer = asyncio.create_task(self._job_thread(job_id, self._spool, job, prepared, outbox, indices))
+        self._producers[job_id] = producer
+
+        def done(task: asyncio.Task) -> None:
+            if self._producers.get(job_id) is task:
+                del self._producers[job_id]
+            if not task.cancelled() and task.exception() is not None:
+                print(f"Job {job_id}: rendering ahead failed: {task.exception()!r}")
+
+        producer.add_done_callback(done)
+
+    @staticmethod
+    def _remark_sent(job: dict, outbox: Outbox) -> None:
+        """Mark the recipients of the delivered messages still in the outbox as contacted.
+
+        Sent messages are only pruned once their marks are synced and their
+        history is written, so this covers a step cut short by a crash.
+        Recipients the history has no entry of this job for get one.
+        """
+        contacts = contact_state(job["request"].file_id)
+        contacts.refresh()
+        sent = {idx: job["recipients"][idx] for idx in outbox.entries(SENT_FOLDER)}
+        for recipient in sent.values():
+            contacts.mark(recipient)
+        contacts.sync()
+        recorded = contact_history.contacted(sent.values(), job=job["id"])
+        for idx, recipient in sent.items():
+            if contact_key(recipient) in recorded:
+                continue
+            message = outbox.read(idx)
+            if message is not None:
+                contact_history.queue(recipient, message.sender, job["id"], job["request"].file_id)
+        contact_history.flush()
+
+    @classmethod
+    def _take_spooled(
+        cls, job: dict, prepared: list, outbox: Outbox, indices: list[int]
+    ) -> dict[int, RawMessage | str | tuple[str, str]]:
+        """Each index's message from the outbox, rendering and spooling those not there yet.
+
+        Indices delivered or failed before a restart map to that outcome
+        instead, and unrenderable ones to the reason.
+        """
+        messages: dict[int, RawMessage | str | tuple[str, str]] = {}
+        missing = []
+        for idx in indices:
+            state = outbox.state(idx)
+            if state == SENT_FOLDER:
+                messages[idx] = (SENT, "")
+            elif state == FAILED_FOLDER:
+                messages[idx] = (FAILED, INTERRUPTED if idx in outbox.interrupted else "failed before a restart")
             else:
-                job["status"] = "completed"
-                self._save(job_id)
-                return
+                message = outbox.read(idx) if state == NEW else None
+                if message is None:
+                    missing.append(idx)
+                else:
+                    messages[idx] = message
+        messages.update(cls._spool(job, prepared, outbox, missing))
+        return messages
 
-    async def _send_one(self, req: BulkJobRequest, recipient: str) -> bool:
-        payload = SendMailRequest(
-            html_body=req.html_body,
-            betreff=req.betreff,
-            recipient=recipient,  # type: ignore[arg-type]
-            from_address=req.from_address,
-        )
-        try:
-            account = resolve_account(payload.from_address)
-            msg = build_message(account, payload)
-            await asyncio.to_thread(send_via_smtp, account, msg)
-            mark_contacted(req.file_id, recipient)
-            return True
-        except Exception:
-            return False
+    @classmethod
+    def _spool(cls, job: dict, prepared: list, outbox: Outbox, indices: list[int]) -> dict[int, RawMessage | str]:
+        """Render messages into the outbox's new folder. Returns them, or why one could not be rendered."""
+        if not indices:
+            return {}
+        with STAGE_SECONDS.time("spool"):
+            messages = cls._render(job, prepared, indices)
+            for idx, message in messages.items():
+                if not isinstance(message, str):
+                    outbox.put(idx, message)
+        return messages
 
+    @staticmethod
+    def _render(job: dict, prepared: list, indices: list[int]) -> dict[int, RawMessage | str]:
+        """Addressed message for each recipient index, or the reason it could not be rendered."""
+        merge: MergeColumns | None = job["merge"]
+        messages: dict[int, RawMessage | str] = {}
+        for idx in indices:
+            if job.get("stopping"):
+                break
+            # Stable account assignment by absolute position, so a resumed job keeps it
+            msg = prepared[idx % len(prepared)]
+            recipient = job["recipients"][idx]
+            if merge is None:
+                messages[idx] = msg.for_recipient(recipient)
+                continue
+            try:
+                messages[idx] = msg.for_recipient(recipient, merge.row(idx))
+            except Exception as exc:
+                messages[idx] = f"template error: {exc}"
+        return messages
+
+    async def _send_one(
+        self, job_id: str, account, message: RawMessage, req: BulkJobRequest, recipient: str,
+        handoff: Callable[[], None] | None = None,
+    ) -> tuple[str, str]:
+        """Send to one recipient. Returns (SENT, ""), or (RETRY or FAILED, reason).
 
+        ``handoff`` runs right before the message goes to the SMTP server.
+        """
+        if contact_state(req.file_id).is_contacted(recipient):
+            # Sent before a restart but the cursor was not persisted yet
+            return SENT, ""
+        sender = account.address
+        if recipient in suppression_list:
+            MESSAGES_FAILED.inc(job_id, sender, "suppressed")
+            return FAILED, f"suppressed: {suppression_list.reason(recipient)}"
+        try:
+            # Addresses were validated and normalized when the job was created
+            await deliver(account, message, handoff=handoff)
+        except Exception as exc:
+            transient, reason = classify_failure(exc)
+            (MESSAGES_DEFERRED if transient else MESSAGES_FAILED).inc(job_id, sender, failure_code(exc))
+            return (RETRY if transient else FAILED), reason
+        MESSAGES_SENT.inc(job_id, sender)
+        try:
+            with STAGE_SECONDS.time("mark_contacted"):
+                mark_contacted(req.file_id, recipient)
+                contact_history.queue(recipient, sender, job_id, req.file_id)
+        except Exception as exc:
+            # The mail is out; resending it would be worse than a missing flag
+            print(f"Could not mark {recipient} as contacted: {exc!r}")
+        return SENT, ""
@@ -0,0 +1,93 @@
+import json
+
+from emailer.paths import JOBS_DIR
+from emailer.utils.files import write_atomic
+
+
+# Fields that change while a job runs; everything else lives only in the snapshot
+PROGRESS_FIELDS = ("cursor", "sent", "failed", "status", "next_run")
+
+# Per-recipient records, keyed by recipient index: {"retry": [idx, attempts, due]}
+# queues a retry, {"retry": [idx]} drops it after a successful send, and
+# {"failure": [idx, reason]} records a final failure
+RETRY_KEY, FAILURE_KEY = "retry", "failure"
+
+# Fold the journal into a fresh snapshot after this many progress records
+COMPACT_EVERY = 500
+
+
+def _apply_recipient_record(data: dict, record: dict) -> None:
+    # Snapshot maps are JSON objects, so their keys are strings
+    if RETRY_KEY in record:
+        idx, *entry = record[RETRY_KEY]
+        retries = data.setdefault("retries", {})
+        if entry:
+            retries[str(idx)] = entry
+        else:
+            retries.pop(str(idx), None)
+    if FAILURE_KEY in record:
+        idx, reason = record[FAILURE_KEY]
+        data.setdefault("retries", {}).pop(str(idx), None)
+        data.setdefault("failures", {})[str(idx)] = reason
+
+
+class JobJournal:
+    """Snapshot plus append-only progress log for one job.
+
+    ``jobs/<id>.json`` holds the request and state of the job and is only
+    rewritten on creation and compaction. Each progress update, queued retry
+    and final failure appends one small JSON line to ``jobs/<id>.journal``.
+    Recipients and placeholder values are written once, at creation, to the
+    packed files ``jobs/<id>.recipients`` and ``jobs/<id>.merge``.
+    """
+
+    def __init__(self, job_id: str):
+        self.snapshot_path = JOBS_DIR / f"{job_id}.json"
+        self.journal_path = JOBS_DIR / f"{job_id}.journal"
+        self.recipients_path = JOBS_DIR / f"{job_id}.recipients"
+        self.merge_path = JOBS_DIR / f"{job_id}.merge"
+        self.pending_records = 0
+        # Monotonic record number; the snapshot stores the last one it includes
+        self.seq = 0
+
+    def write_snapshot(self, data: dict) -> None:
+        write_atomic(self.snapshot_path, json.dumps({**data, "seq": self.seq}, ensure_ascii=False))
+        # The snapshot now covers everything journaled so far
+        self.journal_path.unlink(missing_ok=True)
+        self.pending_records = 0
+
+    def append(self, record: dict) -> bool:
+        """Append a progress or per-recipient record. Returns True once the journal is due for compaction."""
+        self.seq += 1
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({**record, "seq": self.seq}, ensure_ascii=False) + "\n")
+        self.pending_records += 1
+        return self.pending_records >= COMPACT_EVERY
+
+    def load(self) -> dict:
+        """Read the snapshot and replay journaled progress, retries and failures on top of it."""
+        data = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+        self.seq = data.get("seq", 0)
+        if not self.journal_path.exists():
+            return data
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn final line from a crash mid-append
+                    break
+                if record.get("seq", 0) <= self.seq:
+                    # Already folded into the snapshot (crash during compaction)
+                    continue
+                self.seq = record["seq"]
+                data.update({k: v for k, v in record.items() if k in PROGRESS_FIELDS})
+                _apply_recipient_record(data, record)
+                self.pending_records += 1
+        return data
+
+    def delete(self) -> None:
+        self.snapshot_path.unlink(missing_ok=True)
+        self.journal_path.unlink(missing_ok=True)
+        self.recipients_path.unlink(missing_ok=True)
+        self.merge_path.unlink(missing_ok=True)
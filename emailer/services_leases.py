@@ -0,0 +1,234 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Iterable
+
+from emailer.paths import STATE_DIR
+
+
+LEASE_DB_PATH = STATE_DIR / "jobs.db"
+
+# Columns mirrored from JobManager._public so any process can answer status requests
+PUBLIC_COLUMNS = ("id", "total", "sent", "failed", "status", "next_run", "planned_end")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT,
+    expires REAL NOT NULL DEFAULT 0,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    next_run REAL,
+    planned_end REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created);
+CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, expires);
+CREATE TABLE IF NOT EXISTS workers (
+    owner TEXT PRIMARY KEY,
+    expires REAL NOT NULL
+);
+"""
+
+# Status as reported by _public_row, for filtering in SQL
+_STATUS_SQL = "CASE WHEN cancelled = 1 THEN 'cancelled' ELSE status END"
+
+
+def _public_row(row: sqlite3.Row) -> dict:
+    data = {k: row[k] for k in PUBLIC_COLUMNS}
+    if row["cancelled"]:
+        data["status"] = "cancelled"
+    return data
+
+
+class JobLeases:
+    """Shared job table with time-limited ownership leases, in SQLite.
+
+    Every process serving the app opens the same ``state/jobs.db``. A job is
+    worked on only by the process holding its lease; the owner renews it on
+    each heartbeat and mirrors the job's public progress into the row, so any
+    process can list jobs and report status. A lease that is not renewed
+    within its TTL may be claimed by another process. Cancelling a job owned
+    elsewhere sets ``cancelled``; the owner acts on it at its next heartbeat.
+    """
+
+    def __init__(self, path=LEASE_DB_PATH):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), timeout=10, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+                # Tables created before planned_end was mirrored
+                if "planned_end" not in columns:
+                    self._db.execute("ALTER TABLE jobs ADD COLUMN planned_end REAL")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _execute(self, sql: str, params: Iterable = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._db.execute(sql, tuple(params))
+
+    def _write_many(self, sql: str, rows: list[tuple]) -> list[int]:
+        """Run sql once per row in one transaction; returns the rowcount of each."""
+        counts = []
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for row in rows:
+                    counts.append(self._db.execute(sql, row).rowcount)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        return counts
+
+    def create(self, public: dict, ttl: float) -> None:
+        """Add a new job owned by this process."""
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, owner, expires, created, updated, total, sent, failed, status, next_run,"
+            " planned_end) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (public["id"], self.owner, now + ttl, now, now, *(public[k] for k in PUBLIC_COLUMNS[1:])),
+        )
+
+    def register(self, public: dict, created: float) -> None:
+        """Add an unowned row for a job found on disk, unless it is already known."""
+        self._execute(
+            "INSERT OR IGNORE INTO jobs (id, owner, expires, created, updated, total, sent, failed, status,"
+            " next_run, planned_end) VALUES (?, NULL, 0, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (public["id"], created, time.time(), *(public[k] for k in PUBLIC_COLUMNS[1:])),
+        )
+
+    def known_ids(self) -> set[str]:
+        return {row["id"] for row in self._execute("SELECT id FROM jobs")}
+
+    @property
+    def imported(self) -> bool:
+        """Whether job files from before the table existed have been imported."""
+        return self._execute("PRAGMA user_version").fetchone()[0] >= 1
+
+    def mark_imported(self) -> None:
+        self._execute("PRAGMA user_version = 1")
+
+    def claimable(self) -> list[str]:
+        """Unfinished jobs whose lease is free or expired."""
+        rows = self._execute(
+            "SELECT id FROM jobs WHERE cancelled = 0 AND status NOT IN ('completed', 'spooled')"
+            " AND (owner IS NULL OR expires < ?) ORDER BY created",
+            (time.time(),),
+        )
+        return [row["id"] for row in rows]
+
+    def claim(self, job_id: str, ttl: float) -> bool:
+        now = time.time()
+        cur = self._execute(
+            "UPDATE jobs SET owner = ?, expires = ?, updated = ? WHERE id = ? AND cancelled = 0"
+            " AND status NOT IN ('completed', 'spooled') AND (owner IS NULL OR owner = ? OR expires < ?)",
+            (self.owner, now + ttl, now, job_id, self.owner, now),
+        )
+        return cur.rowcount == 1
+
+    def heartbeat(self, jobs: list[dict], ttl: float) -> tuple[set[str], set[str], int]:
+        """Renew this process's presence and the leases of ``jobs`` (public dicts), storing their progress.
+
+        Returns (lost, cancelled, workers): jobs this process no longer owns,
+        owned jobs another process asked to cancel, and the number of live
+        processes including this one.
+        """
+        now = time.time()
+        self._execute(
+            "INSERT INTO workers (owner, expires) VALUES (?, ?)"
+            " ON CONFLICT (owner) DO UPDATE SET expires = excluded.expires",
+            (self.owner, now + ttl),
+        )
+        self._execute("DELETE FROM workers WHERE expires < ?", (now,))
+        workers = self._execute("SELECT COUNT(*) FROM workers").fetchone()[0]
+        counts = self._write_many(
+            "UPDATE jobs SET expires = ?, updated = ?, sent = ?, failed = ?, status = ?, next_run = ?,"
+            " planned_end = ? WHERE id = ? AND owner = ?",
+            [
+                (now + ttl, now, j["sent"], j["failed"], j["status"], j["next_run"], j["planned_end"], j["id"],
+                 self.owner)
+                for j in jobs
+            ],
+        )
+        lost = {j["id"] for j, count in zip(jobs, counts) if count == 0}
+        rows = self._execute("SELECT id FROM jobs WHERE owner = ? AND cancelled = 1", (self.owner,))
+        return lost, {row["id"] for row in rows}, workers
+
+    def leave(self) -> None:
+        """Withdraw this process's presence, e.g. on shutdown."""
+        self._execute("DELETE FROM workers WHERE owner = ?", (self.owner,))
+
+    def release(self, public: dict) -> None:
+        """Give up ownership, storing the job's final public state."""
+        self._execute(
+            "UPDATE jobs SET owner = NULL, expires = 0, updated = ?, sent = ?, failed = ?, status = ?, next_run = ?,"
+            " planned_end = ? WHERE id = ? AND owner = ?",
+            (time.time(), public["sent"], public["failed"], public["status"], public["next_run"],
+             public["planned_end"], public["id"], self.owner),
+        )
+
+    def mark_cancelled(self, job_id: str) -> bool | None:
+        """Flag a job for cancellation. Returns None if unknown, else whether a live owner holds it."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT owner, expires FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE jobs SET cancelled = 1, updated = ? WHERE id = ?", (now, job_id))
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        if row is None:
+            return None
+        return row["owner"] is not None and row["expires"] >= now
+
+    def delete(self, job_id: str) -> None:
+        self._execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def get(self, job_id: str) -> dict | None:
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _public_row(row) if row else None
+
+    def page(self, statuses: Iterable[str] | None, offset: int, limit: int | None) -> tuple[list[dict], int]:
+        """Newest jobs first, optionally filtered by status. Returns (page, total matches)."""
+        where, params = "", []
+        wanted = list(statuses or ())
+        if wanted:
+            where = f" WHERE {_STATUS_SQL} IN ({','.join('?' * len(wanted))})"
+            params = wanted
+        total = self._execute(f"SELECT COUNT(*) FROM jobs{where}", params).fetchone()[0]
+        rows = self._execute(
+            f"SELECT * FROM jobs{where} ORDER BY created DESC LIMIT ? OFFSET ?",
+            [*params, -1 if limit is None else limit, offset],
+        )
+        return [_public_row(row) for row in rows], total
+
+    def updated_since(self, since: float) -> list[dict]:
+        """Public state of jobs not owned by this process that changed after ``since``."""
+        rows = self._execute(
+            "SELECT * FROM jobs WHERE updated > ? AND (owner IS NULL OR owner != ?)",
+            (since, self.owner),
+        )
+        return [_public_row(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
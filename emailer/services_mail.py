@@ -1,19 +1,34 @@
-import smtplib
+from email.generator import BytesGenerator
 from email.message import EmailMessage
+from email.policy import SMTP
 from email.mime.multipart import MIMEMultipart
+from email.mime.nonmultipart import MIMENonMultipart
 from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
+from functools import lru_cache
+from typing import Callable
+import asyncio
+import base64
+import io
 from pathlib import Path
 import re
+import time
 
+from emailer.utils.metrics import SEND_SECONDS, SENDS_IN_FLIGHT, STAGE_SECONDS
 from emailer.utils.settings import get_mail_settings
 from emailer.schemas import SendMailRequest
 from emailer.paths import UPLOAD_DIR
+from emailer.services_images import image_part
+from emailer.services_smtp import RawMessage, smtp_pool
+from emailer.services_smtp_async import async_smtp_pool
+from emailer.services_ratelimit import rate_limiter
 from fastapi import HTTPException
 
 
+LOCAL_IMAGE_RE = re.compile(r'<img[^>]+src=["\'](uploads/[^"\']+)["\']')
+
+
 def extract_local_images(html: str):
-    return re.findall(r'<img[^>]+src=["\'](uploads/[^"\']+)["\']', html)
+    return LOCAL_IMAGE_RE.findall(html)
 
 
 def generate_cid_for_image(image_path):
@@ -38,82 +53,242 @@ def resolve_account(from_address: str | None):
     raise HTTPException(status_code=500, detail="No mail account configured")
 
 
-def build_message(account, payload: SendMailRequest):
-    local_images = extract_local_images(payload.html_body)
+def inline_images(html_body: str) -> tuple[str, list[Path]]:
+    """The body with uploaded images pointed at their cid, and the image files to attach."""
+    image_paths = []
+    for image_url in extract_local_images(html_body):
+        image_path = UPLOAD_DIR / Path(image_url).name
+        if image_path.exists():
+            cid = generate_cid_for_image(image_url)
+            html_body = html_body.replace(image_url, f"cid:{cid}")
+            image_paths.append(image_path)
+    return html_body, image_paths
+
+
+def _build_mime(account, html_body: str, betreff: str, recipient: str | None):
+    local_images = extract_local_images(html_body)
     if local_images:
         msg = MIMEMultipart('related')
-        msg["Subject"] = payload.betreff
+        msg["Subject"] = betreff
         msg["From"] = account.address
-        msg["To"] = str(payload.recipient)
-        msg["Bcc"] = account.address
-        html_body = payload.html_body
-        for image_url in local_images:
-            image_path = UPLOAD_DIR / Path(image_url).name
-            if image_path.exists():
-                cid = generate_cid_for_image(image_url)
-                html_body = html_body.replace(image_url, f"cid:{cid}")
+        if recipient is not None:
+            msg["To"] = recipient
+            msg["Bcc"] = account.address
+        html_body, image_paths = inline_images(html_body)
         msg_alt = MIMEMultipart('alternative')
         msg.attach(msg_alt)
         msg_alt.attach(MIMEText("Please enable HTML to view this email.", 'plain'))
         msg_alt.attach(MIMEText(html_body, 'html'))
-        for image_url in local_images:
-            image_path = UPLOAD_DIR / Path(image_url).name
-            if image_path.exists():
-                cid = generate_cid_for_image(image_url)
-                file_ext = image_path.suffix.lower()
-                if file_ext == '.png':
-                    subtype = 'png'
-                elif file_ext in ['.jpg', '.jpeg']:
-                    subtype = 'jpeg'
-                elif file_ext == '.gif':
-                    subtype = 'gif'
-                else:
-                    subtype = 'png'
-                with open(image_path, "rb") as f:
-                    img_data = f.read()
-                img = MIMEImage(img_data, _subtype=subtype)
-                img.add_header('Content-ID', f'<{cid}>')
-                img.add_header('Content-Disposition', 'inline', filename=image_path.name)
-                msg.attach(img)
+        for image_path in image_paths:
+            msg.attach(image_part(image_path, generate_cid_for_image(image_path)))
         return msg
     else:
         msg = EmailMessage()
-        msg["Subject"] = payload.betreff
+        msg["Subject"] = betreff
         msg["From"] = account.address
-        msg["To"] = str(payload.recipient)
-        msg["Bcc"] = account.address
+        if recipient is not None:
+            msg["To"] = recipient
+            msg["Bcc"] = account.address
         msg.set_content("Please enable HTML to view this email.")
-        msg.add_alternative(payload.html_body, subtype="html")
+        msg.add_alternative(html_body, subtype="html")
         return msg
 
 
+def build_message(account, payload: SendMailRequest):
+    return _build_mime(account, payload.html_body, payload.betreff, str(payload.recipient))
+
+
+class PreparedMessage:
+    """A bulk message built and serialized once, then addressed per recipient.
+
+    Only the To header differs between recipients, so it is prepended to the
+    pre-serialized bytes; the sender is added to the envelope as Bcc.
+    """
+
+    def __init__(self, account, html_body: str, betreff: str):
+        self.account = account
+        with STAGE_SECONDS.time("build_message"):
+            self._body = _serialize(_build_mime(account, html_body, betreff, None))
+
+    def for_recipient(self, recipient: str) -> RawMessage:
+        to_header = SMTP.fold_binary("To", recipient)
+        return RawMessage(
+            sender=self.account.address,
+            recipients=[recipient, self.account.address],
+            data=to_header + self._body,
+        )
+
+
+# Stands in for the HTML part's encoded body in a MergedMessage skeleton
+_HTML_SLOT = b"@@emailer-html-body@@"
+
+
+def _serialize(msg) -> bytes:
+    # Serialize the way smtplib.send_message would: message policy, CRLF line endings
+    buf = io.BytesIO()
+    BytesGenerator(buf, policy=msg.policy).flatten(msg, linesep="\r\n")
+    return buf.getvalue()
+
+
+@lru_cache(maxsize=4096)
+def _subject_header(subject: str) -> bytes:
+    """Folded Subject header line, far cheaper than the email package's own folding.
+
+    Short ASCII subjects are written as they are; others become RFC 2047
+    base64 encoded words of at most 40 bytes (68 characters) each, one per
+    line, never splitting a character. Long ASCII subjects are left to the
+    email package.
+    """
+    if subject.isascii():
+        if len(subject) <= 69:
+            return f"Subject: {subject}\r\n".encode("ascii")
+        return SMTP.fold_binary("Subject", SMTP.header_factory("Subject", subject))
+    words, chunk = [], b""
+    for char in subject:
+        encoded = char.encode("utf-8")
+        if len(chunk) + len(encoded) > 40:
+            words.append(chunk)
+            chunk = b""
+        chunk += encoded
+    words.append(chunk)
+    return b"Subject: " + b"\r\n ".join(b"=?utf-8?b?" + base64.b64encode(w) + b"?=" for w in words) + b"\r\n"
+
+
+def _base64_lines(data: bytes) -> bytes:
+    # Lines of 76 characters; the skeleton supplies the final line break
+    encoded = base64.b64encode(data)
+    return b"\r\n".join([encoded[i:i + 76] for i in range(0, len(encoded), 76)])
+
+
+class MergedMessage:
+    """A personalized bulk message: the MIME skeleton is serialized once, subject and HTML per recipient.
+
+    The skeleton holds everything static (headers, text part, inline image
+    parts) and a slot for the base64 HTML body. Each recipient's rendered
+    HTML is encoded into that slot; Subject and To are prepended as headers.
+    Takes the body with images already pointed at their cid (inline_images).
+    """
+
+    def __init__(self, account, template, image_paths: list[Path]):
+        self.account = account
+        self.template = template
+        with STAGE_SECONDS.time("build_message"):
+            html_part = MIMENonMultipart("text", "html", charset="utf-8")
+            html_part["Content-Transfer-Encoding"] = "base64"
+            html_part.set_payload(_HTML_SLOT.decode("ascii"))
+            alternative = MIMEMultipart("alternative")
+            alternative.attach(MIMEText("Please enable HTML to view this email.", "plain"))
+            alternative.attach(html_part)
+            msg = alternative
+            if image_paths:
+                msg = MIMEMultipart("related")
+                msg.attach(alternative)
+                for image_path in image_paths:
+                    msg.attach(image_part(image_path, generate_cid_for_image(image_path)))
+            msg["From"] = account.address
+            self._head, self._tail = _serialize(msg).split(_HTML_SLOT)
+
+    def for_recipient(self, recipient: str, row: dict[str, str]) -> RawMessage:
+        subject, html = self.template.render(row)
+        headers = _subject_header(subject) + SMTP.fold_binary("To", recipient)
+        return RawMessage(
+            sender=self.account.address,
+            recipients=[recipient, self.account.address],
+            data=headers + self._head + _base64_lines(html.encode("utf-8")) + self._tail,
+        )
+
+
 def send_via_smtp(account, msg):
-    settings = get_mail_settings()
-    with smtplib.SMTP(settings.smtp_host, settings.smtp_port) as server:
-        server.starttls()
-        server.login(account.address, account.password)
-        server.send_message(msg)
+    smtp_pool.send(account, msg)
+
+
+async def send_via_smtp_async(account, msg):
+    """Send msg on the event loop with the transport selected by mail.smtp_transport."""
+    if get_mail_settings().smtp_transport == "asyncio":
+        await async_smtp_pool.send(account, msg)
+    else:
+        await asyncio.to_thread(send_via_smtp, account, msg)
+
+
+# address -> (limit, semaphore); replaced when max_concurrency changes in config
+_account_slots: dict[str, tuple[int, asyncio.Semaphore]] = {}
+
+
+def account_slots(account) -> asyncio.Semaphore:
+    """Semaphore bounding in-flight sends for an account across all jobs and /sendmail."""
+    entry = _account_slots.get(account.address)
+    if entry is None or entry[0] != account.max_concurrency:
+        entry = (account.max_concurrency, asyncio.Semaphore(account.max_concurrency))
+        _account_slots[account.address] = entry
+    return entry[1]
+
+
+async def deliver(account, msg, max_wait: float | None = None, handoff: Callable[[], None] | None = None) -> None:
+    """Send msg from account within its rate limits and configured concurrency.
+
+    Waits for a rate-limit token; with ``max_wait`` set, raises RateLimitExceeded
+    rather than waiting longer than that. ``handoff`` is called once the waiting
+    is over, right before the message goes to the SMTP server.
+    """
+    started = time.perf_counter()
+    SENDS_IN_FLIGHT.inc(account.address)
+    try:
+        with STAGE_SECONDS.time("rate_limit_wait"):
+            await rate_limiter.acquire(account, max_wait=max_wait)
+        slots = account_slots(account)
+        with STAGE_SECONDS.time("slot_wait"):
+            await slots.acquire()
+        try:
+            if handoff is not None:
+                handoff()
+            await send_via_smtp_async(account, msg)
+        finally:
+            slots.release()
+    finally:
+        SENDS_IN_FLIGHT.dec(account.address)
+        SEND_SECONDS.observe(time.perf_counter() - started, account.address)
 
 
 # Startup-time credential validation
-def validate_mail_credentials() -> dict[str, str]:
-    """Attempt to login for each configured account. Returns map address->"ok" or error string."""
-    results: dict[str, str] = {}
+def configured_accounts() -> list:
     settings = get_mail_settings()
-    accounts = []
-    if settings.accounts:
-        accounts.extend(settings.accounts.values())
-    if settings.schreiber:
-        accounts.append(settings.schreiber)
+    accounts = {}
+    for acc in [*settings.accounts.values(), *([settings.schreiber] if settings.schreiber else [])]:
+        accounts.setdefault(acc.address, acc)
+    return list(accounts.values())
+
+
+def _login(account) -> None:
+    # Keep the authenticated session around so the first send can reuse it
+    session = smtp_pool.acquire(account)
+    smtp_pool.release(account, session)
+
+
+async def validate_mail_credentials() -> dict[str, str]:
+    """Log in to all configured accounts concurrently. Returns map address->"ok" or error string.
+
+    Each login is bounded by mail.credential_check_timeout.
+    """
+    settings = get_mail_settings()
+    accounts = configured_accounts()
     if not accounts:
         return {"_config": "no accounts configured"}
-    for acc in accounts:
+    timeout = settings.credential_check_timeout
+
+    async def check(acc) -> str:
         try:
-            with smtplib.SMTP(settings.smtp_host, settings.smtp_port) as server:
-                server.starttls()
-                server.login(acc.address, acc.password)
-            results[acc.address] = "ok"
+            async with asyncio.timeout(timeout):
+                if settings.smtp_transport == "asyncio":
+                    session = await async_smtp_pool.acquire(acc)
+                    async_smtp_pool.release(acc, session)
+                else:
+                    # The thread finishes on its own socket timeout if this gives up first
+                    await asyncio.to_thread(_login, acc)
+        except TimeoutError:
+            return f"login timed out after {timeout:g}s"
         except Exception as exc:
-            results[acc.address] = f"login failed: {exc}"
-    return results
+            return f"login failed: {exc}"
+        return "ok"
 
+    results = await asyncio.gather(*(check(acc) for acc in accounts))
+    return {acc.address: result for acc, result in zip(accounts, results)}
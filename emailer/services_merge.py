@@ -0,0 +1,105 @@
+from datetime import date, datetime
+from typing import Any, Iterable, Sequence
+import re
+
+from fastapi import HTTPException
+from jinja2 import StrictUndefined, TemplateSyntaxError, meta
+from jinja2.sandbox import SandboxedEnvironment
+
+from emailer.utils.packed import PackedStrings
+
+
+# Templates come from the UI, so they cannot reach Python internals
+_HTML_ENV = SandboxedEnvironment(autoescape=True, undefined=StrictUndefined, keep_trailing_newline=True)
+_TEXT_ENV = SandboxedEnvironment(autoescape=False, undefined=StrictUndefined)
+
+
+def is_template(source: str) -> bool:
+    """Whether text uses Jinja2 syntax; plain bodies are sent as they are."""
+    return "{{" in source or "{%" in source
+
+
+def column_name(header: Any) -> str:
+    """Placeholder name for a sheet header: lower-cased, runs of other characters turned into '_'."""
+    name = re.sub(r"\W+", "_", str(header or "").strip().lower()).strip("_")
+    return f"_{name}" if name[:1].isdigit() else name
+
+
+def _fields(env: SandboxedEnvironment, source: str) -> set[str]:
+    if not is_template(source):
+        return set()
+    try:
+        return meta.find_undeclared_variables(env.parse(source))
+    except TemplateSyntaxError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid placeholder syntax in line {exc.lineno}: {exc.message}")
+
+
+def template_fields(html_body: str, betreff: str) -> set[str]:
+    """Placeholders used by a body and subject; raises HTTPException 400 on syntax errors."""
+    return _fields(_HTML_ENV, html_body) | _fields(_TEXT_ENV, betreff)
+
+
+def cell_text(value: Any) -> str:
+    """A sheet cell as it reads in Excel: whole numbers without '.0', dates as DD.MM.YYYY."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "ja" if value else "nein"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime) and not (value.hour or value.minute or value.second):
+        value = value.date()
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return value.strftime("%d.%m.%Y")
+    return str(value).strip()
+
+
+class MergeColumns:
+    """Per-recipient placeholder values, stored column by column.
+
+    One list per column, aligned with the job's recipient list, instead of
+    one dict per row; repeated values (a company, a city) share one string.
+    """
+
+    def __init__(self, columns: Iterable[str], values: list[Sequence[str]] | None = None):
+        self.columns = list(columns)
+        self.values = values if values is not None else [[] for _ in self.columns]
+        self._interned: list[dict[str, str]] = [{} for _ in self.columns]
+
+    def append(self, row: Iterable[str]) -> None:
+        for column, interned, value in zip(self.values, self._interned, row):
+            column.append(interned.setdefault(value, value))
+
+    def row(self, idx: int) -> dict[str, str]:
+        return {name: column[idx] for name, column in zip(self.columns, self.values)}
+
+    def to_json(self) -> dict:
+        return {"columns": self.columns, "values": self.values}
+
+    @classmethod
+    def from_json(cls, data: dict | None) -> "MergeColumns | None":
+        if not data:
+            return None
+        return cls(data["columns"], data["values"])
+
+    @classmethod
+    def from_table(cls, columns: list[str], table: PackedStrings, rows: int) -> "MergeColumns":
+        """Columns stored one after another, ``rows`` values each, in one packed table."""
+        return cls(columns, [table.window(i * rows, rows) for i in range(len(columns))])
+
+
+class MergeTemplate:
+    """Subject and HTML body of a job, compiled once and rendered per recipient."""
+
+    def __init__(self, html_body: str, betreff: str):
+        self._html = _HTML_ENV.from_string(html_body) if is_template(html_body) else None
+        self._subject = _TEXT_ENV.from_string(betreff) if is_template(betreff) else None
+        self._html_source = html_body
+        self._subject_source = betreff
+
+    def render(self, row: dict[str, str]) -> tuple[str, str]:
+        """(subject, html) for one recipient. Raises jinja2 errors for broken templates."""
+        subject = self._subject.render(row) if self._subject else self._subject_source
+        html = self._html.render(row) if self._html else self._html_source
+        # Header values must stay on one line
+        return " ".join(subject.split()), html
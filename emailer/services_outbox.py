@@ -0,0 +1,153 @@
+import os
+import re
+import shutil
+import threading
+import uuid
+
+from emailer.paths import OUTBOX_DIR
+from emailer.services_smtp import RawMessage
+
+
+# Maildir-style folders a spooled message moves through, in order
+TMP, NEW, CUR, SENT, FAILED = "tmp", "new", "cur", "sent", "failed"
+FOLDERS = (NEW, CUR, SENT, FAILED)
+
+# Reason recorded for messages found in cur after a crash
+INTERRUPTED = "delivery interrupted by a restart; not resent to avoid a duplicate"
+
+# '<recipient index>,S=<size>', the size suffix as in Maildir++
+_NAME_RE = re.compile(r"^(\d+),S=(\d+)$")
+
+_ENVELOPE_FROM = b"X-Envelope-From: "
+_ENVELOPE_TO = b"X-Envelope-To: "
+
+
+def _encode(message: RawMessage) -> bytes:
+    envelope = (
+        _ENVELOPE_FROM + message.sender.encode("ascii") + b"\r\n"
+        + _ENVELOPE_TO + ", ".join(message.recipients).encode("ascii") + b"\r\n"
+    )
+    return envelope + message.data
+
+
+def _decode(raw: bytes) -> RawMessage:
+    sender_line, to_line, data = raw.split(b"\r\n", 2)
+    if not sender_line.startswith(_ENVELOPE_FROM) or not to_line.startswith(_ENVELOPE_TO):
+        raise ValueError("missing envelope")
+    return RawMessage(
+        sender=sender_line[len(_ENVELOPE_FROM):].decode("ascii"),
+        recipients=to_line[len(_ENVELOPE_TO):].decode("ascii").split(", "),
+        data=data,
+    )
+
+
+class Outbox:
+    """Rendered messages of one job, spooled Maildir-style under ``outbox/<job id>/``.
+
+    A message is written to tmp and renamed into new once complete. Delivery
+    renames it to cur right before the SMTP handoff and to sent or failed
+    afterwards (back to new for a retry), so its folder always tells how far
+    it got. The name carries the message size, so a file cut short by a
+    crash is re-rendered instead of sent. Only the process holding the job's
+    lease uses its outbox.
+    """
+
+    def __init__(self, job_id: str):
+        self.root = OUTBOX_DIR / job_id
+        self._lock = threading.Lock()
+        # Recipient index -> (folder, file name)
+        self._where: dict[int, tuple[str, str]] = {}
+        self.interrupted: set[int] = set()
+        for folder in (TMP, *FOLDERS):
+            (self.root / folder).mkdir(parents=True, exist_ok=True)
+        for folder in FOLDERS:
+            for name in os.listdir(self.root / folder):
+                match = _NAME_RE.match(name)
+                if match:
+                    self._where[int(match.group(1))] = (folder, name)
+
+    def state(self, idx: int) -> str | None:
+        entry = self._where.get(idx)
+        return entry[0] if entry else None
+
+    def path(self, idx: int):
+        entry = self._where.get(idx)
+        return self.root / entry[0] / entry[1] if entry else None
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            counts = {folder: 0 for folder in FOLDERS}
+            for folder, _ in self._where.values():
+                counts[folder] += 1
+        return counts
+
+    def entries(self, folder: str) -> list[int]:
+        with self._lock:
+            return sorted(idx for idx, (where, _) in self._where.items() if where == folder)
+
+    def put(self, idx: int, message: RawMessage) -> None:
+        """Spool a rendered message into new, unless the index is spooled already."""
+        raw = _encode(message)
+        name = f"{idx},S={len(raw)}"
+        tmp = self.root / TMP / f"{name}.{uuid.uuid4().hex}"
+        with open(tmp, "wb") as f:
+            f.write(raw)
+        with self._lock:
+            if idx in self._where:
+                tmp.unlink(missing_ok=True)
+                return
+            os.rename(tmp, self.root / NEW / name)
+            self._where[idx] = (NEW, name)
+
+    def read(self, idx: int) -> RawMessage | None:
+        """The spooled message, or None when it is missing or was cut short (then it is dropped)."""
+        path = self.path(idx)
+        if path is None:
+            return None
+        try:
+            raw = path.read_bytes()
+            if len(raw) != int(_NAME_RE.match(path.name).group(2)):
+                raise ValueError("truncated")
+            return _decode(raw)
+        except (OSError, ValueError):
+            with self._lock:
+                self._where.pop(idx, None)
+            path.unlink(missing_ok=True)
+            return None
+
+    def move(self, idx: int, folder: str) -> None:
+        with self._lock:
+            entry = self._where.get(idx)
+            if entry is None or entry[0] == folder:
+                return
+            os.rename(self.root / entry[0] / entry[1], self.root / folder / entry[1])
+            self._where[idx] = (folder, entry[1])
+
+    def recover(self) -> list[int]:
+        """When taking over the job: drop unfinished writes, move messages caught mid-delivery to failed."""
+        for name in os.listdir(self.root / TMP):
+            # Never renamed into new, so never complete
+            (self.root / TMP / name).unlink(missing_ok=True)
+        stuck = self.entries(CUR)
+        for idx in stuck:
+            self.move(idx, FAILED)
+        self.interrupted.update(stuck)
+        return stuck
+
+    def prune_sent(self, below: int) -> None:
+        """Delete delivered messages whose index the job's saved cursor has passed."""
+        with self._lock:
+            done = [(idx, name) for idx, (folder, name) in self._where.items() if folder == SENT and idx < below]
+            for idx, _ in done:
+                del self._where[idx]
+        for _, name in done:
+            (self.root / SENT / name).unlink(missing_ok=True)
+
+    def delete(self) -> None:
+        with self._lock:
+            self._where.clear()
+        delete_outbox(self.root.name)
+
+
+def delete_outbox(job_id: str) -> None:
+    shutil.rmtree(OUTBOX_DIR / job_id, ignore_errors=True)
@@ -0,0 +1,213 @@
+from datetime import datetime
+from typing import Iterable
+
+from emailer.schemas import BulkJobRequest
+from emailer.services_mail import resolve_account
+from emailer.utils.settings import BERLIN_TZ, get_settings
+from emailer.utils.work_calendar import WorkCalendar
+
+
+# Slots missed by more than this (downtime, a long batch) are dropped rather than sent in a burst
+CATCH_UP_SECONDS = 5.0
+
+
+def account_calendar(account=None) -> WorkCalendar:
+    """Work calendar of a sender account: its own days and windows, else those under [scheduler]."""
+    sched = get_settings().scheduler
+    workdays = sched.workdays if account is None or account.workdays is None else account.workdays
+    windows = sched.window_list() if account is None or account.windows is None else account.windows
+    holidays = [*sched.holidays, *(account.holidays if account is not None else ())]
+    return WorkCalendar.from_schedule(workdays, windows, holidays, BERLIN_TZ)
+
+
+def job_calendar(accounts: list) -> WorkCalendar:
+    """Open only when all of a job's sender accounts are."""
+    calendars = [account_calendar(account) for account in accounts] or [account_calendar()]
+    calendar = calendars[0]
+    for other in calendars[1:]:
+        calendar = calendar.intersect(other)
+    return calendar
+
+
+def send_until_timestamp(req: BulkJobRequest) -> float | None:
+    """The job's target end as a timestamp; times without a zone are Berlin time."""
+    until = req.send_until
+    if until is None:
+        return None
+    if until.tzinfo is None:
+        until = until.replace(tzinfo=BERLIN_TZ)
+    return until.timestamp()
+
+
+def min_interval(account, calendar: WorkCalendar) -> float:
+    """Shortest spacing in open seconds that keeps an account within its provider quotas."""
+    gaps = [0.0]
+    if account.max_per_minute:
+        gaps.append(60.0 / account.max_per_minute)
+    if account.max_per_hour:
+        gaps.append(3600.0 / account.max_per_hour)
+    if account.max_per_day and calendar.daily_seconds():
+        gaps.append(calendar.daily_seconds() / account.max_per_day)
+    return max(gaps)
+
+
+def _fair_shares(demands: dict[str, float], capacity: float) -> dict[str, float]:
+    """Split a rate among jobs: small demands are met, the rest share what is left equally."""
+    shares: dict[str, float] = {}
+    left = capacity
+    pending = sorted(demands.items(), key=lambda item: item[1])
+    while pending:
+        job_id, demand = pending.pop(0)
+        shares[job_id] = min(demand, left / (len(pending) + 1))
+        left -= shares[job_id]
+    return shares
+
+
+class PacingPlanner:
+    """Evenly spaced send slots for the jobs of this process, within their work calendars.
+
+    A job sends one message per slot. Its spacing follows ``send_until`` (the
+    open time left, divided by the messages left), ``per_hour``, or else
+    ``batch_size`` messages per ``interval_minutes``. Slots only fall into the
+    open time of all the job's sender accounts. Jobs sharing an account with
+    quotas split them, so they slow down together rather than queue on the
+    rate limiter. Adding or removing a job replans only the jobs that share an
+    account with it; a config reload replans all. Used slots are kept and
+    only the remaining ones move.
+    """
+
+    def __init__(self):
+        self._plans: dict[str, dict] = {}
+        self._jobs: dict[str, dict] = {}
+        # Sender address -> ids of the planned jobs using it
+        self._by_account: dict[str, set[str]] = {}
+
+    def add(self, job_id: str, job: dict) -> set[str]:
+        """Plan a new or taken-over job. Returns the ids whose next slot moved, itself included."""
+        self._jobs[job_id] = job
+        self._plans[job_id] = {"slot": None, "last": None}
+        return self._replan({job_id} | self._neighbours(self._attach(job_id)))
+
+    def remove(self, job_id: str) -> set[str]:
+        """Forget a finished, cancelled or lost job. Returns the ids of the jobs replanned."""
+        plan = self._plans.pop(job_id, None)
+        self._jobs.pop(job_id, None)
+        if plan is None:
+            return set()
+        for address in plan.get("addresses", ()):
+            jobs = self._by_account.get(address)
+            if jobs is not None:
+                jobs.discard(job_id)
+                if not jobs:
+                    del self._by_account[address]
+        return self._replan(self._neighbours(plan.get("addresses", ())))
+
+    def replan_all(self) -> set[str]:
+        """Rebuild calendars and spacing after the config changed."""
+        self._by_account.clear()
+        for job_id in self._plans:
+            self._attach(job_id)
+        return self._replan(set(self._plans))
+
+    def clear(self) -> None:
+        self._plans.clear()
+        self._jobs.clear()
+        self._by_account.clear()
+
+    def calendar(self, job_id: str) -> WorkCalendar:
+        return self._plans[job_id]["calendar"]
+
+    def next_slot(self, job_id: str) -> float:
+        return self._plans[job_id]["slot"]
+
+    def planned_end(self, job_id: str) -> float | None:
+        plan = self._plans.get(job_id)
+        return plan.get("end") if plan else None
+
+    def take(self, job_id: str, now: float, limit: int) -> int:
+        """Use up to ``limit`` slots that are due at ``now``. Returns how many were due."""
+        plan = self._plans[job_id]
+        calendar, interval = plan["calendar"], plan["interval"]
+        slot = plan["slot"]
+        if slot < now - max(CATCH_UP_SECONDS, interval):
+            slot = calendar.next_open(now)
+        count = 0
+        while count < limit and slot <= now:
+            count += 1
+            plan["last"] = slot
+            slot = calendar.advance(slot, interval)
+        plan["slot"] = slot
+        return count
+
+    def _attach(self, job_id: str) -> list[str]:
+        """Resolve the job's accounts and calendar; returns the sender addresses."""
+        plan, job = self._plans[job_id], self._jobs[job_id]
+        req: BulkJobRequest = job["request"]
+        try:
+            accounts = [resolve_account(address) for address in req.accounts or [req.from_address]]
+        except Exception:
+            # Account removed from the config; sending will fail, plan by [scheduler] meanwhile
+            accounts = []
+        plan["calendar"] = job_calendar(accounts)
+        plan["accounts"] = accounts
+        plan["addresses"] = [account.address for account in accounts]
+        for address in plan["addresses"]:
+            self._by_account.setdefault(address, set()).add(job_id)
+        return plan["addresses"]
+
+    def _neighbours(self, addresses: Iterable[str]) -> set[str]:
+        job_ids: set[str] = set()
+        for address in addresses:
+            job_ids |= self._by_account.get(address, set())
+        return job_ids
+
+    def _desired_interval(self, job_id: str, now: float) -> float:
+        plan, job = self._plans[job_id], self._jobs[job_id]
+        req: BulkJobRequest = job["request"]
+        until = send_until_timestamp(req)
+        if until is not None:
+            remaining = len(job["recipients"]) - job["cursor"] + len(job["retries"])
+            start = plan["slot"] if plan["slot"] is not None and plan["slot"] > now else now
+            open_time = plan["calendar"].open_seconds(start, until)
+            if open_time > 0:
+                return open_time / max(1, remaining)
+            # Past the target: carry on at the batch pace instead of all at once
+        if req.per_hour:
+            return 3600.0 / req.per_hour
+        return max(0, req.interval_minutes) * 60.0 / max(1, req.batch_size)
+
+    def _replan(self, job_ids: set[str]) -> set[str]:
+        now = datetime.now(BERLIN_TZ).timestamp()
+        for job_id in job_ids:
+            self._plans[job_id]["desired"] = self._desired_interval(job_id, now)
+        intervals = {job_id: self._plans[job_id]["desired"] for job_id in job_ids}
+        # Accounts with quotas are shared by all jobs sending through them
+        accounts = {account.address: account for j in job_ids for account in self._plans[j]["accounts"]}
+        for address, account in accounts.items():
+            gap = min_interval(account, account_calendar(account))
+            if gap <= 0:
+                continue
+            demands = {}
+            for j in self._by_account.get(address, ()):
+                desired, spread = self._plans[j]["desired"], len(self._plans[j]["accounts"])
+                # A job spread over n accounts sends every n-th message through each
+                demands[j] = 1.0 / (desired * spread) if desired > 0 else float("inf")
+            for j, share in _fair_shares(demands, 1.0 / gap).items():
+                if j in intervals:
+                    spread = len(self._plans[j]["accounts"])
+                    intervals[j] = max(intervals[j], 1.0 / (share * spread))
+        moved: set[str] = set()
+        for job_id, interval in intervals.items():
+            plan, job = self._plans[job_id], self._jobs[job_id]
+            calendar = plan["calendar"]
+            plan["interval"] = interval
+            if plan["last"] is not None:
+                slot = calendar.advance(plan["last"], interval)
+            else:
+                slot = calendar.next_open(max(now, job.get("next_run") or now))
+            if slot != plan["slot"]:
+                moved.add(job_id)
+            plan["slot"] = slot
+            remaining = len(job["recipients"]) - job["cursor"] + len(job["retries"])
+            plan["end"] = calendar.advance(slot, (remaining - 1) * interval) if remaining > 0 else None
+        return moved
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+from emailer.paths import STATE_DIR
+
+
+STATE_PATH = STATE_DIR / "rate_limits.db"
+# Bucket levels of versions that kept them per process; imported once
+LEGACY_STATE_PATH = STATE_DIR / "rate_limits.json"
+
+# Account setting -> window length in seconds
+WINDOWS = {
+    "max_per_minute": 60,
+    "max_per_hour": 3600,
+    "max_per_day": 86400,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    address TEXT NOT NULL,
+    window TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (address, window)
+);
+"""
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a caller is not willing to wait for the account's next token."""
+
+
+class TokenBucket:
+    """Holds up to ``capacity`` tokens, refilled evenly over ``period`` seconds."""
+
+    def __init__(self, capacity: int, period: float, tokens: float | None = None, updated: float | None = None):
+        self.capacity = capacity
+        self.period = period
+        self.tokens = float(capacity) if tokens is None else min(float(tokens), capacity)
+        # Wall-clock time so levels stay meaningful across restarts
+        self.updated = time.time() if updated is None else updated
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.capacity / self.period)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.period / self.capacity
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """Token-bucket quotas per sender address, shared by every send path and process.
+
+    Each configured window (minute/hour/day) is its own bucket; a send needs a
+    token from all of them. Bucket levels live in ``state/rate_limits.db``,
+    which every process serving the app opens, and a token is taken in one
+    write transaction, so several workers together stay within one quota.
+    Waiters for the same account queue in FIFO order within a process.
+    """
+
+    def __init__(self, path=STATE_PATH, legacy_path=LEGACY_STATE_PATH):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), timeout=10, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._import_legacy(legacy_path)
+
+    def _import_legacy(self, legacy_path) -> None:
+        if not legacy_path.exists():
+            return
+        try:
+            data = json.loads(legacy_path.read_text(encoding="utf-8"))
+            rows = [
+                (address, key, b["capacity"], b["tokens"], b["updated"])
+                for address, buckets in data.items()
+                for key, b in buckets.items()
+                if key in WINDOWS
+            ]
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO buckets (address, window, capacity, tokens, updated) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            legacy_path.unlink(missing_ok=True)
+        except Exception as exc:
+            print(f"Ignoring {legacy_path}: {exc}")
+
+    @staticmethod
+    def _limits(account) -> dict[str, int]:
+        return {key: getattr(account, key) for key in WINDOWS if getattr(account, key, None)}
+
+    def _try_take(self, account) -> float:
+        """Take a token from each of the account's buckets if all have one.
+
+        Returns 0 when taken, else the seconds until they will have. Buckets
+        follow the account's current limits, resized if the config changed.
+        """
+        limits = self._limits(account)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                stored = {
+                    row[0]: row[1:]
+                    for row in self._db.execute(
+                        "SELECT window, tokens, updated FROM buckets WHERE address = ?", (account.address,)
+                    )
+                }
+                buckets = {
+                    key: TokenBucket(limit, WINDOWS[key], *stored.get(key, (None, None)))
+                    for key, limit in limits.items()
+                }
+                now = time.time()
+                wait = max(b.wait_time(now) for b in buckets.values())
+                if wait > 0:
+                    self._db.execute("ROLLBACK")
+                    return wait
+                for bucket in buckets.values():
+                    bucket.take()
+                self._db.execute("DELETE FROM buckets WHERE address = ?", (account.address,))
+                self._db.executemany(
+                    "INSERT INTO buckets (address, window, capacity, tokens, updated) VALUES (?, ?, ?, ?, ?)",
+                    [(account.address, key, b.capacity, b.tokens, b.updated) for key, b in buckets.items()],
+                )
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        return 0.0
+
+    async def acquire(self, account, max_wait: float | None = None) -> None:
+        """Wait until the account may send one more message and consume its token.
+
+        With ``max_wait`` set, give up with RateLimitExceeded instead of queueing longer.
+        """
+        if max_wait is None:
+            return await self._acquire(account)
+        try:
+            await asyncio.wait_for(self._acquire(account), timeout=max_wait)
+        except asyncio.TimeoutError:
+            raise RateLimitExceeded(f"Send quota for {account.address} exhausted")
+
+    async def _acquire(self, account) -> None:
+        if not self._limits(account):
+            return
+        lock = self._locks.setdefault(account.address, asyncio.Lock())
+        async with lock:
+            while True:
+                wait = await asyncio.to_thread(self._try_take, account)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,215 @@
+from dataclasses import dataclass
+from email.generator import BytesGenerator
+from email.utils import getaddresses
+import copy
+import io
+import smtplib
+import socket
+import threading
+import time
+
+from emailer.utils.metrics import STAGE_SECONDS
+from emailer.utils.settings import get_mail_settings
+
+
+# Idle sessions older than this are probed with NOOP before being reused
+NOOP_AFTER_SECONDS = 10.0
+
+# Failure reasons are kept per recipient; server replies can be long
+MAX_REASON_LENGTH = 200
+
+
+@dataclass
+class RawMessage:
+    """Pre-serialized message with an explicit envelope."""
+    sender: str
+    recipients: list[str]
+    data: bytes
+
+
+def to_raw_message(msg) -> RawMessage:
+    """Flatten a Message the way smtplib.send_message does: envelope from headers, Bcc stripped."""
+    sender = msg["Sender"] or msg["From"]
+    recipients = [addr for _, addr in getaddresses(msg.get_all("To", []) + msg.get_all("Cc", []) + msg.get_all("Bcc", []))]
+    msg_copy = copy.copy(msg)
+    del msg_copy["Bcc"]
+    buf = io.BytesIO()
+    BytesGenerator(buf, policy=msg.policy).flatten(msg_copy, linesep="\r\n")
+    return RawMessage(sender=getaddresses([sender])[0][1], recipients=recipients, data=buf.getvalue())
+
+
+def check_refused(recipients: list[str], refused: dict) -> None:
+    """Raise if the server refused the first envelope recipient, the one the mail is for.
+
+    smtplib only raises when every recipient is refused; a refused copy to
+    anyone else (e.g. the sender's own copy) does not fail the send.
+    """
+    if recipients and recipients[0] in refused:
+        raise smtplib.SMTPRecipientsRefused({recipients[0]: refused[recipients[0]]})
+
+
+def _transmit(server: smtplib.SMTP, msg) -> None:
+    with STAGE_SECONDS.time("smtp_send"):
+        if isinstance(msg, RawMessage):
+            check_refused(msg.recipients, server.sendmail(msg.sender, msg.recipients, msg.data))
+        else:
+            server.send_message(msg)
+
+
+def is_reconnectable(exc: Exception) -> bool:
+    """Errors after which a fresh connection is worth one more attempt."""
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code == 421:
+        return True
+    return isinstance(exc, (socket.timeout, TimeoutError, ConnectionError))
+
+
+def keeps_session(exc: BaseException) -> bool:
+    """Whether a session is still usable after a failed send: the server replied and the transaction was reset."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    # 421 means the server is closing the connection; -1 is an unreadable reply
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code not in (421, -1)
+
+
+def classify_failure(exc: BaseException) -> tuple[bool, str]:
+    """(transient, reason) for a failed send.
+
+    4xx replies, dropped connections and timeouts are transient: the same
+    message may well go through later. 5xx replies are permanent, except for
+    rejected logins, which are fixed in the config rather than per recipient.
+    Anything else (e.g. a message that cannot be encoded) is permanent too, so
+    it is not retried forever.
+    """
+    if isinstance(exc, smtplib.SMTPRecipientsRefused) and exc.recipients:
+        code, text = next(iter(exc.recipients.values()))
+    elif isinstance(exc, smtplib.SMTPResponseException):
+        code, text = exc.smtp_code, exc.smtp_error
+    else:
+        # Socket errors, timeouts and dropped sessions; smtplib's own errors are OSErrors too
+        return isinstance(exc, OSError), f"{type(exc).__name__}: {exc}"[:MAX_REASON_LENGTH]
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", "replace")
+    reason = f"{code} {text}".strip()[:MAX_REASON_LENGTH]
+    transient = not 500 <= code < 600 or isinstance(exc, smtplib.SMTPAuthenticationError)
+    return transient, reason
+
+
+def _close(server: smtplib.SMTP) -> None:
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+class SmtpSession:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.last_used = time.monotonic()
+
+
+class SmtpPool:
+    """Authenticated SMTP sessions kept alive per sender address.
+
+    Sessions are checked out for a single send and returned afterwards, so
+    consecutive messages from the same account skip connect, STARTTLS and AUTH.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle: dict[str, list[SmtpSession]] = {}
+
+    def _connect(self, account) -> SmtpSession:
+        settings = get_mail_settings()
+        started = time.perf_counter()
+        server = smtplib.SMTP(settings.smtp_host, settings.smtp_port, timeout=settings.smtp_timeout)
+        try:
+            if settings.smtp_starttls:
+                server.starttls()
+            STAGE_SECONDS.observe(time.perf_counter() - started, "smtp_connect")
+            with STAGE_SECONDS.time("smtp_login"):
+                server.login(account.address, account.password)
+        except Exception:
+            _close(server)
+            raise
+        return SmtpSession(server)
+
+    def _healthy(self, session: SmtpSession) -> bool:
+        if time.monotonic() - session.last_used < NOOP_AFTER_SECONDS:
+            return True
+        try:
+            code, _ = session.server.noop()
+        except Exception:
+            return False
+        return code == 250
+
+    def acquire(self, account) -> SmtpSession:
+        while True:
+            with self._lock:
+                idle = self._idle.get(account.address)
+                session = idle.pop() if idle else None
+            if session is None:
+                return self._connect(account)
+            if self._healthy(session):
+                return session
+            _close(session.server)
+
+    def release(self, account, session: SmtpSession) -> None:
+        session.last_used = time.monotonic()
+        with self._lock:
+            self._idle.setdefault(account.address, []).append(session)
+
+    def discard(self, session: SmtpSession) -> None:
+        _close(session.server)
+
+    def send(self, account, msg) -> None:
+        session = self.acquire(account)
+        try:
+            _transmit(session.server, msg)
+        except Exception as exc:
+            if keeps_session(exc):
+                # A refused sender, recipient or message; the next one can use the session
+                self.release(account, session)
+                raise
+            self.discard(session)
+            if not is_reconnectable(exc):
+                raise
+            # Server dropped us (421, idle timeout, reset): retry once on a fresh session
+            session = self._connect(account)
+            try:
+                _transmit(session.server, msg)
+            except Exception as exc:
+                if keeps_session(exc):
+                    self.release(account, session)
+                else:
+                    self.discard(session)
+                raise
+        self.release(account, session)
+
+    def reap_idle(self) -> int:
+        """Close sessions idle for longer than the configured TTL. Returns count closed."""
+        ttl = get_mail_settings().smtp_idle_ttl
+        cutoff = time.monotonic() - ttl
+        expired: list[SmtpSession] = []
+        with self._lock:
+            for address, sessions in self._idle.items():
+                keep = [s for s in sessions if s.last_used >= cutoff]
+                expired.extend(s for s in sessions if s.last_used < cutoff)
+                self._idle[address] = keep
+        for session in expired:
+            _close(session.server)
+        return len(expired)
+
+    def close_all(self) -> None:
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            _close(session.server)
+
+
+smtp_pool = SmtpPool()
@@ -0,0 +1,266 @@
+from functools import cache
+import asyncio
+import base64
+import re
+import smtplib
+import socket
+import ssl
+import time
+
+from emailer.services_smtp import (
+    NOOP_AFTER_SECONDS, RawMessage, check_refused, is_reconnectable, keeps_session, to_raw_message,
+)
+from emailer.utils.metrics import STAGE_SECONDS
+from emailer.utils.settings import get_mail_settings
+
+
+CRLF = b"\r\n"
+
+
+@cache
+def _local_hostname() -> str:
+    return socket.getfqdn()
+
+
+def _quote_periods(data: bytes) -> bytes:
+    # Same transparency rules as smtplib.SMTP.data
+    q = re.sub(rb"(?m)^\.", b"..", data)
+    if q[-2:] != CRLF:
+        q += CRLF
+    return q + b"." + CRLF
+
+
+class AsyncSmtpClient:
+    """Minimal asyncio SMTP client: EHLO, STARTTLS, AUTH and pipelined MAIL/RCPT/DATA.
+
+    Errors are raised as the corresponding smtplib exceptions so callers can
+    treat both transports alike.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.extensions: dict[str, str] = {}
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def _read_reply(self) -> tuple[int, str]:
+        lines = []
+        async with asyncio.timeout(self.timeout):
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+                try:
+                    code = int(line[:3])
+                except ValueError:
+                    raise smtplib.SMTPResponseException(-1, line)
+                lines.append(line[4:].strip().decode("utf-8", "replace"))
+                if line[3:4] != b"-":
+                    return code, "\n".join(lines)
+
+    async def _command(self, line: str, expect: tuple[int, ...]) -> tuple[int, str]:
+        self._writer.write(line.encode("ascii") + CRLF)
+        await self._writer.drain()
+        code, msg = await self._read_reply()
+        if code not in expect:
+            raise smtplib.SMTPResponseException(code, msg)
+        return code, msg
+
+    async def _ehlo(self) -> None:
+        _, msg = await self._command(f"EHLO {_local_hostname()}", (250,))
+        self.extensions = {}
+        for item in msg.split("\n")[1:]:
+            name, _, params = item.partition(" ")
+            self.extensions[name.upper()] = params
+
+    async def connect(self, starttls: bool) -> None:
+        async with asyncio.timeout(self.timeout):
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        sock = self._writer.get_extra_info("socket")
+        if sock is not None:
+            # Pipelined commands are written back to back; don't let Nagle hold them
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        code, msg = await self._read_reply()
+        if code != 220:
+            raise smtplib.SMTPConnectError(code, msg)
+        await self._ehlo()
+        if starttls:
+            if "STARTTLS" not in self.extensions:
+                raise smtplib.SMTPNotSupportedError("STARTTLS extension not supported by server.")
+            await self._command("STARTTLS", (220,))
+            async with asyncio.timeout(self.timeout):
+                await self._writer.start_tls(ssl.create_default_context(), server_hostname=self.host)
+            await self._ehlo()
+
+    async def login(self, user: str, password: str) -> None:
+        mechanisms = self.extensions.get("AUTH", "").upper().split()
+        try:
+            if "PLAIN" in mechanisms or "LOGIN" not in mechanisms:
+                token = base64.b64encode(f"\0{user}\0{password}".encode("utf-8")).decode("ascii")
+                await self._command(f"AUTH PLAIN {token}", (235, 503))
+            else:
+                await self._command("AUTH LOGIN", (334,))
+                await self._command(base64.b64encode(user.encode("utf-8")).decode("ascii"), (334,))
+                await self._command(base64.b64encode(password.encode("utf-8")).decode("ascii"), (235, 503))
+        except smtplib.SMTPResponseException as exc:
+            raise smtplib.SMTPAuthenticationError(exc.smtp_code, exc.smtp_error)
+
+    async def noop(self) -> int:
+        code, _ = await self._command("NOOP", (250,))
+        return code
+
+    async def sendmail(self, sender: str, recipients: list[str], data: bytes) -> dict:
+        commands = [f"MAIL FROM:<{sender}>"] + [f"RCPT TO:<{r}>" for r in recipients] + ["DATA"]
+        if "PIPELINING" in self.extensions:
+            self._writer.write(b"".join(c.encode("ascii") + CRLF for c in commands))
+            await self._writer.drain()
+            replies = [await self._read_reply() for _ in commands]
+        else:
+            replies = []
+            for c in commands:
+                self._writer.write(c.encode("ascii") + CRLF)
+                await self._writer.drain()
+                replies.append(await self._read_reply())
+                if c == commands[0] and replies[0][0] != 250:
+                    break
+        mail_reply = replies[0]
+        rcpt_replies = replies[1:len(recipients) + 1]
+        data_reply = replies[-1] if len(replies) == len(commands) else None
+        if mail_reply[0] != 250:
+            await self._reset()
+            raise smtplib.SMTPSenderRefused(mail_reply[0], mail_reply[1], sender)
+        refused = {r: reply for r, reply in zip(recipients, rcpt_replies) if reply[0] not in (250, 251)}
+        if len(refused) == len(recipients):
+            if data_reply is not None and data_reply[0] == 354:
+                # Server accepted DATA despite no valid recipients; end it empty
+                self._writer.write(b"." + CRLF)
+                await self._writer.drain()
+                await self._read_reply()
+            await self._reset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        if data_reply is None or data_reply[0] != 354:
+            await self._reset()
+            raise smtplib.SMTPDataError(*(data_reply or (-1, "DATA not sent")))
+        self._writer.write(_quote_periods(data))
+        await self._writer.drain()
+        code, msg = await self._read_reply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, msg)
+        # Match smtplib: delivered to some recipients, report the rest
+        return refused
+
+    async def _reset(self) -> None:
+        try:
+            await self._command("RSET", (250,))
+        except smtplib.SMTPException:
+            pass
+
+    async def quit(self) -> None:
+        try:
+            await self._command("QUIT", (221,))
+        except Exception:
+            pass
+        self.close()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class AsyncSmtpSession:
+    def __init__(self, client: AsyncSmtpClient):
+        self.client = client
+        self.last_used = time.monotonic()
+
+
+class AsyncSmtpPool:
+    """Event-loop counterpart of SmtpPool: authenticated sessions kept alive per sender address."""
+
+    def __init__(self):
+        self._idle: dict[str, list[AsyncSmtpSession]] = {}
+
+    async def _connect(self, account) -> AsyncSmtpSession:
+        settings = get_mail_settings()
+        client = AsyncSmtpClient(settings.smtp_host, settings.smtp_port, settings.smtp_timeout)
+        try:
+            with STAGE_SECONDS.time("smtp_connect"):
+                await client.connect(settings.smtp_starttls)
+            with STAGE_SECONDS.time("smtp_login"):
+                await client.login(account.address, account.password)
+        except BaseException:
+            client.close()
+            raise
+        return AsyncSmtpSession(client)
+
+    async def _healthy(self, session: AsyncSmtpSession) -> bool:
+        if time.monotonic() - session.last_used < NOOP_AFTER_SECONDS:
+            return True
+        try:
+            return await session.client.noop() == 250
+        except Exception:
+            return False
+
+    async def acquire(self, account) -> AsyncSmtpSession:
+        while True:
+            idle = self._idle.get(account.address)
+            if not idle:
+                return await self._connect(account)
+            session = idle.pop()
+            if await self._healthy(session):
+                return session
+            session.client.close()
+
+    def release(self, account, session: AsyncSmtpSession) -> None:
+        session.last_used = time.monotonic()
+        self._idle.setdefault(account.address, []).append(session)
+
+    async def send(self, account, msg) -> None:
+        raw = msg if isinstance(msg, RawMessage) else to_raw_message(msg)
+        session = await self.acquire(account)
+        try:
+            with STAGE_SECONDS.time("smtp_send"):
+                refused = await session.client.sendmail(raw.sender, raw.recipients, raw.data)
+        except BaseException as exc:
+            if keeps_session(exc):
+                # A refused sender, recipient or message; the next one can use the session
+                self.release(account, session)
+                raise
+            session.client.close()
+            if not isinstance(exc, Exception) or not is_reconnectable(exc):
+                raise
+            # Server dropped us (421, idle timeout, reset): retry once on a fresh session
+            session = await self._connect(account)
+            try:
+                with STAGE_SECONDS.time("smtp_send"):
+                    refused = await session.client.sendmail(raw.sender, raw.recipients, raw.data)
+            except BaseException as exc:
+                if keeps_session(exc):
+                    self.release(account, session)
+                else:
+                    session.client.close()
+                raise
+        self.release(account, session)
+        check_refused(raw.recipients, refused)
+
+    async def reap_idle(self) -> int:
+        """Close sessions idle for longer than the configured TTL. Returns count closed."""
+        cutoff = time.monotonic() - get_mail_settings().smtp_idle_ttl
+        expired: list[AsyncSmtpSession] = []
+        for address, sessions in self._idle.items():
+            expired.extend(s for s in sessions if s.last_used < cutoff)
+            self._idle[address] = [s for s in sessions if s.last_used >= cutoff]
+        for session in expired:
+            await session.client.quit()
+        return len(expired)
+
+    async def close_all(self) -> None:
+        sessions = [s for idle in self._idle.values() for s in idle]
+        self._idle.clear()
+        for session in sessions:
+            await session.client.quit()
+
+
+async_smtp_pool = AsyncSmtpPool()
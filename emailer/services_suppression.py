@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+import time
+from typing import Iterable
+
+from emailer.paths import STATE_DIR
+from emailer.utils.addresses import contact_key
+
+
+SUPPRESSION_DB_PATH = STATE_DIR / "suppression.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS suppressed (
+    key TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imap_sync (
+    account TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    uidvalidity INTEGER,
+    last_uid INTEGER NOT NULL DEFAULT 0,
+    synced REAL,
+    locked_until REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (account, mailbox)
+);
+"""
+
+
+class SuppressionList:
+    """Addresses that must not be mailed again (bounces, unsubscribe replies), in SQLite.
+
+    ``state/suppression.db`` is shared by all processes serving the app. Each
+    keeps the suppressed contact keys in a set for O(1) checks and catches up
+    with rows added elsewhere on ``refresh``, which only reads new rows. The
+    database also holds the IMAP sync watermark of each account's mailbox.
+    """
+
+    def __init__(self, path=SUPPRESSION_DB_PATH):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), timeout=10, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._keys: set[str] = set()
+        self._rowid = 0
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        self.refresh()
+
+    def _execute(self, sql: str, params: Iterable = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._db.execute(sql, tuple(params))
+
+    def refresh(self) -> None:
+        """Pick up addresses suppressed by another process since the last refresh."""
+        rows = self._execute("SELECT rowid, key FROM suppressed WHERE rowid > ?", (self._rowid,)).fetchall()
+        for row in rows:
+            self._keys.add(row["key"])
+            self._rowid = max(self._rowid, row["rowid"])
+
+    def __contains__(self, email: str) -> bool:
+        return contact_key(email) in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, entries: Iterable[tuple[str, str]], source: str) -> int:
+        """Suppress (email, reason) pairs; the first reason for an address is kept. Returns the count added."""
+        now = time.time()
+        rows = [(contact_key(email), email, reason, source, now) for email, reason in entries]
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO suppressed (key, email, reason, source, created) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            added = self._db.total_changes - before
+        self.refresh()
+        return added
+
+    def reason(self, email: str) -> str | None:
+        row = self._execute("SELECT reason FROM suppressed WHERE key = ?", (contact_key(email),)).fetchone()
+        return row["reason"] if row else None
+
+    def page(self, offset: int, limit: int) -> tuple[list[dict], int]:
+        """Most recently suppressed first. Returns (page, total)."""
+        total = self._execute("SELECT COUNT(*) FROM suppressed").fetchone()[0]
+        rows = self._execute(
+            "SELECT email, reason, source, created FROM suppressed ORDER BY rowid DESC LIMIT ? OFFSET ?",
+            (limit, offset),
+        )
+        return [dict(row) for row in rows], total
+
+    def lock_mailbox(self, account: str, mailbox: str, ttl: float) -> bool:
+        """Take the right to sync a mailbox for ``ttl`` seconds, unless another process holds it."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO imap_sync (account, mailbox) VALUES (?, ?)", (account, mailbox))
+            cur = self._db.execute(
+                "UPDATE imap_sync SET locked_until = ? WHERE account = ? AND mailbox = ? AND locked_until < ?",
+                (now + ttl, account, mailbox, now),
+            )
+        return cur.rowcount == 1
+
+    def unlock_mailbox(self, account: str, mailbox: str) -> None:
+        self._execute(
+            "UPDATE imap_sync SET locked_until = 0 WHERE account = ? AND mailbox = ?", (account, mailbox)
+        )
+
+    def watermark(self, account: str, mailbox: str) -> tuple[int | None, int]:
+        """(UIDVALIDITY, highest UID processed) of a mailbox; (None, 0) before its first sync."""
+        row = self._execute(
+            "SELECT uidvalidity, last_uid FROM imap_sync WHERE account = ? AND mailbox = ?", (account, mailbox)
+        ).fetchone()
+        return (row["uidvalidity"], row["last_uid"]) if row else (None, 0)
+
+    def set_watermark(self, account: str, mailbox: str, uidvalidity: int, last_uid: int) -> None:
+        self._execute(
+            "INSERT INTO imap_sync (account, mailbox, uidvalidity, last_uid, synced) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (account, mailbox) DO UPDATE SET"
+            " uidvalidity = excluded.uidvalidity, last_uid = excluded.last_uid, synced = excluded.synced",
+            (account, mailbox, uidvalidity, last_uid, time.time()),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+suppression_list = SuppressionList()
@@ -0,0 +1,57 @@
+from pathlib import Path
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from fastapi import HTTPException, UploadFile
+
+
+CHUNK_SIZE = 1024 * 1024
+
+_SUFFIX_RE = re.compile(r"^\.[a-z0-9]{1,8}$")
+
+
+def safe_suffix(filename: str | None, default: str) -> str:
+    """Lower-cased extension of filename, or default when missing or unusual."""
+    suffix = Path(filename or "").suffix.lower()
+    return suffix if _SUFFIX_RE.match(suffix) else default
+
+
+def _append(out, digest, chunk: bytes) -> None:
+    digest.update(chunk)
+    out.write(chunk)
+
+
+def _publish(tmp: Path, path: Path) -> bool:
+    """Move the finished upload to ``path``; True if the same content was stored before."""
+    if path.exists():
+        return True
+    os.replace(tmp, path)
+    return False
+
+
+async def store_upload(file: UploadFile, directory: Path, suffix: str, max_bytes: int) -> tuple[Path, bool]:
+    """Stream an upload to ``directory/<sha256><suffix>`` in chunks.
+
+    Returns the stored path and whether it already existed (same content
+    uploaded before). Uploads larger than ``max_bytes`` are rejected with 413.
+    Hashing and disk writes run in worker threads, off the event loop.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp = directory / f".upload-{uuid.uuid4().hex}.tmp"
+    try:
+        out = await asyncio.to_thread(open, tmp, "wb")
+        try:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File too large (max {max_bytes} bytes)")
+                await asyncio.to_thread(_append, out, digest, chunk)
+        finally:
+            await asyncio.to_thread(out.close)
+        path = directory / f"{digest.hexdigest()}{suffix}"
+        return path, await asyncio.to_thread(_publish, tmp, path)
+    finally:
+        await asyncio.to_thread(tmp.unlink, missing_ok=True)
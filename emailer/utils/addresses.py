@@ -0,0 +1,38 @@
+import re
+
+from email_validator import EmailNotValidError, validate_email
+
+
+# Plain ASCII dot-atom addresses with a hostname domain; anything else goes to email_validator
+_SIMPLE_EMAIL_RE = re.compile(
+    r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@((?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63})"
+)
+
+
+def normalize_email(raw: str) -> str:
+    """Validated address in the form it is sent to, domain lower-cased and IDNA-encoded.
+
+    Raises ValueError with a human-readable reason for invalid addresses and
+    for non-ASCII local parts, which the SMTP transports cannot send.
+    """
+    address = raw.strip()
+    match = _SIMPLE_EMAIL_RE.fullmatch(address)
+    if match and len(address) <= 254 and address.index("@") <= 64:
+        return address[:match.start(1)] + match.group(1).lower()
+    try:
+        result = validate_email(address, check_deliverability=False, allow_smtputf8=False)
+    except EmailNotValidError as exc:
+        raise ValueError(str(exc)) from None
+    return result.ascii_email or result.normalized
+
+
+def contact_key(email: str) -> str:
+    """Case-insensitive identity of an address, for dedup and contacted-state lookups."""
+    address = (email or "").strip()
+    if not address.isascii():
+        try:
+            address = normalize_email(address)
+        except ValueError:
+            pass
+    return address.casefold()
@@ -0,0 +1,132 @@
+import re
+from email.message import Message
+from email.utils import getaddresses, parseaddr
+from typing import Iterable
+
+from emailer.utils.addresses import contact_key, normalize_email
+
+
+# Reasons are stored per address; diagnostic codes can be long
+MAX_REASON_LENGTH = 200
+
+# Only the reply's own text is searched, up to this many characters
+UNSUBSCRIBE_SCAN_CHARS = 2000
+
+_UNSUBSCRIBE_RE = re.compile(
+    r"\b(unsubscribe|abmelden|abmeldung|austragen|abbestellen|remove me|opt[- ]?out"
+    r"|keine (weiteren )?(e-?mails|mails|nachrichten|werbung)"
+    r"|nicht mehr (kontaktieren|anschreiben|anmailen|schreiben))\b",
+    re.IGNORECASE,
+)
+
+# Start of the quoted original in a reply
+_QUOTE_START_RE = re.compile(
+    r"^\s*(-{2,}\s*(original|ursprüngliche)|(on|am) .+ (wrote|schrieb)|(from|von):\s)",
+    re.IGNORECASE,
+)
+
+_BOUNCE_SENDER_RE = re.compile(r"^(mailer-daemon|postmaster)@", re.IGNORECASE)
+
+# "Re:", and the German "AW:"/"Antw:", optionally counted as in "Re[2]:"
+_REPLY_SUBJECT_RE = re.compile(r"^\s*(re|aw|antw)\s*(\[\d+\])?\s*:", re.IGNORECASE)
+
+
+def _normalized(raw: str) -> str | None:
+    try:
+        return normalize_email(raw)
+    except ValueError:
+        return None
+
+
+def _dsn_failures(msg: Message) -> list[tuple[str, str]]:
+    """Permanently failed recipients of an RFC 3464 delivery status notification."""
+    failures = []
+    for part in msg.walk():
+        if part.get_content_type() != "message/delivery-status":
+            continue
+        # The first block holds per-message fields, the rest one recipient each
+        for block in part.get_payload()[1:]:
+            action = str(block.get("Action", "")).strip().lower()
+            status = str(block.get("Status", "")).strip()
+            if action != "failed" or not status.startswith("5"):
+                continue
+            recipient = str(block.get("Final-Recipient") or block.get("Original-Recipient") or "")
+            address = _normalized(recipient.partition(";")[2] or recipient)
+            if address:
+                diagnostic = " ".join(str(block.get("Diagnostic-Code", "")).partition(";")[2].split())
+                failures.append((address, f"bounce {status} {diagnostic}".strip()[:MAX_REASON_LENGTH]))
+    return failures
+
+
+def _is_automated(msg: Message) -> bool:
+    auto = str(msg.get("Auto-Submitted", "no")).strip().lower()
+    precedence = str(msg.get("Precedence", "")).strip().lower()
+    return (
+        auto != "no"
+        or precedence in ("bulk", "junk", "list", "auto_reply")
+        or msg.get("X-Autoreply") is not None
+        or msg.get_content_type() == "multipart/report"
+        or bool(_BOUNCE_SENDER_RE.match(parseaddr(str(msg.get("From", "")))[1]))
+    )
+
+
+def _is_reply(msg: Message) -> bool:
+    return (
+        msg.get("In-Reply-To") is not None
+        or msg.get("References") is not None
+        or bool(_REPLY_SUBJECT_RE.match(str(msg.get("Subject", ""))))
+    )
+
+
+def _reply_text(msg: Message) -> str:
+    """The reply's own text: plain text (or HTML with tags removed), cut at the quoted original."""
+    try:
+        body = msg.get_body(preferencelist=("plain", "html"))
+    except AttributeError:
+        # Messages parsed with the compat32 policy have no get_body
+        body = None
+    if body is None:
+        return ""
+    try:
+        text = body.get_content()
+    except (LookupError, UnicodeError):
+        return ""
+    if body.get_content_subtype() == "html":
+        text = re.sub(r"<[^>]*>", " ", re.sub(r"(?is)<(style|script|blockquote).*?</\1>", " ", text))
+    lines = []
+    for line in text.splitlines():
+        if _QUOTE_START_RE.match(line):
+            break
+        if not line.lstrip().startswith(">"):
+            lines.append(line)
+    return "\n".join(lines)[:UNSUBSCRIBE_SCAN_CHARS]
+
+
+def parse_suppressions(msg: Message, own_addresses: Iterable[str] = ()) -> list[tuple[str, str]]:
+    """(address, reason) pairs a received message asks never to mail again.
+
+    Delivery status notifications yield their permanently failed recipients;
+    bounces without one are recognized by ``X-Failed-Recipients``. A reply by
+    a person asking to be removed (in the subject or its own, unquoted text)
+    yields its sender. Only replies count, so a campaign mention of
+    "abmelden" in a new mail does not. Auto-replies are never read as
+    unsubscribe requests. Mail from ``own_addresses``, such as the sender's
+    Bcc copy of a campaign, is skipped.
+    """
+    if contact_key(parseaddr(str(msg.get("From", "")))[1]) in {contact_key(a) for a in own_addresses}:
+        return []
+    failures = _dsn_failures(msg)
+    if failures:
+        return failures
+    failed_header = msg.get_all("X-Failed-Recipients", [])
+    if failed_header:
+        addresses = (_normalized(addr) for _, addr in getaddresses([str(h) for h in failed_header]))
+        return [(address, "bounce") for address in addresses if address]
+    if _is_automated(msg) or not _is_reply(msg):
+        return []
+    sender = _normalized(parseaddr(str(msg.get("From", "")))[1])
+    if sender is None:
+        return []
+    if _UNSUBSCRIBE_RE.search(str(msg.get("Subject", ""))) or _UNSUBSCRIBE_RE.search(_reply_text(msg)):
+        return [(sender, "unsubscribe")]
+    return []
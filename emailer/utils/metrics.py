@@ -0,0 +1,218 @@
+from bisect import bisect_left
+from typing import Callable
+import smtplib
+import threading
+import time
+
+
+# Seconds; covers a cached settings read up to a slow SMTP login
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def forget(self, label: str, value) -> None:
+        """Drop every series whose ``label`` equals ``value`` (e.g. a deleted job)."""
+        if label not in self.labels:
+            return
+        pos = self.labels.index(label)
+        with self._lock:
+            for key in [k for k in self._values if k[pos] == value]:
+                del self._values[key]
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labels, k)} {_format_number(v)}" for k, v in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: "Histogram", labels: tuple):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # [per-bucket counts..., +Inf count, sum]
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1] += value
+
+    def time(self, *labels) -> _Timer:
+        """Context manager observing the wall time of its block."""
+        return _Timer(self, labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = self._header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-1]!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def on_collect(self, collector: Callable[[], None]) -> None:
+        """Run ``collector`` before each render, e.g. to set gauges from live state."""
+        self._collectors.append(collector)
+
+    def forget(self, label: str, value) -> None:
+        for metric in self._metrics:
+            metric.forget(label, value)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as exc:
+                print(f"Metrics collector failed: {exc!r}")
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def failure_code(exc: BaseException) -> str:
+    """Label for a failed send: the SMTP reply code when there is one, else the exception type."""
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return str(exc.smtp_code)
+    if isinstance(exc, smtplib.SMTPRecipientsRefused) and exc.recipients:
+        return str(next(iter(exc.recipients.values()))[0])
+    return type(exc).__name__
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "emailer_stage_seconds",
+    "Time spent per stage of the send pipeline.",
+    ("stage",),
+))
+SEND_SECONDS = registry.register(Histogram(
+    "emailer_send_seconds",
+    "Time to hand one message to the SMTP server, including rate-limit and concurrency waits.",
+    ("account",),
+))
+MESSAGES_SENT = registry.register(Counter(
+    "emailer_messages_sent_total",
+    "Messages accepted by the SMTP server.",
+    ("job", "account"),
+))
+MESSAGES_FAILED = registry.register(Counter(
+    "emailer_messages_failed_total",
+    "Sends that failed permanently, by SMTP reply code or error type.",
+    ("job", "account", "code"),
+))
+MESSAGES_DEFERRED = registry.register(Counter(
+    "emailer_messages_deferred_total",
+    "Sends that failed transiently and were queued for a retry, by SMTP reply code or error type.",
+    ("job", "account", "code"),
+))
+SENDS_IN_FLIGHT = registry.register(Gauge(
+    "emailer_sends_in_flight",
+    "Messages currently being sent or waiting for a rate-limit token or connection slot.",
+    ("account",),
+))
+JOBS = registry.register(Gauge(
+    "emailer_jobs",
+    "Jobs owned by this process, by status.",
+    ("status",),
+))
+JOBS_READY = registry.register(Gauge(
+    "emailer_jobs_ready",
+    "Jobs due and waiting for a free worker.",
+))
+JOBS_SCHEDULED = registry.register(Gauge(
+    "emailer_jobs_scheduled",
+    "Jobs waiting for their next run time.",
+))
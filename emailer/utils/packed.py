@@ -0,0 +1,78 @@
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Iterable
+import mmap
+import os
+import struct
+
+
+# File layout: magic, count, count + 1 little-endian uint64 offsets into the blob, UTF-8 blob
+MAGIC = b"EMPSTR1\0"
+_HEADER = struct.Struct("<8sQ")
+_OFFSET = struct.Struct("<Q")
+_SPAN = struct.Struct("<QQ")
+
+
+def write_packed(path: Path, strings: Iterable[str]) -> int:
+    """Write strings to one packed file, atomically. Returns how many were written."""
+    encoded = [value.encode("utf-8") for value in strings]
+    offsets = bytearray(_OFFSET.size * (len(encoded) + 1))
+    position = 0
+    for i, value in enumerate(encoded):
+        position += len(value)
+        _OFFSET.pack_into(offsets, _OFFSET.size * (i + 1), position)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(encoded)))
+        f.write(offsets)
+        f.write(b"".join(encoded))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(encoded)
+
+
+class PackedStrings(Sequence):
+    """A read-only list of strings in a file written by ``write_packed``, mapped instead of loaded.
+
+    Only the pages holding the items read are paged in, so a million
+    addresses take no heap. ``window`` gives a sub-list sharing the mapping.
+    """
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a packed string file")
+        self._offsets = _HEADER.size
+        self._blob = _HEADER.size + _OFFSET.size * (count + 1)
+        self._start = 0
+        self._length = count
+
+    def window(self, start: int, length: int) -> "PackedStrings":
+        """Items ``start`` to ``start + length`` as a list of their own."""
+        if start < 0 or length < 0 or start + length > self._length:
+            raise IndexError("window out of range")
+        view = object.__new__(PackedStrings)
+        view._map, view._offsets, view._blob = self._map, self._offsets, self._blob
+        view._start, view._length = self._start + start, length
+        return view
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self._length))]
+        if idx < 0:
+            idx += self._length
+        if not 0 <= idx < self._length:
+            raise IndexError("index out of range")
+        begin, end = _SPAN.unpack_from(self._map, self._offsets + _OFFSET.size * (self._start + idx))
+        return self._map[self._blob + begin:self._blob + end].decode("utf-8")
+
+    def close(self) -> None:
+        """Unmap the file, for all windows of it, so it can be deleted on Windows."""
+        self._map.close()
@@ -1,17 +1,39 @@
 from pathlib import Path
-from typing import Optional
-from datetime import datetime
+from typing import Callable, Literal, Optional
+import hashlib
+import threading
+from datetime import date, datetime
 from zoneinfo import ZoneInfo
-from pydantic import Field
+from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import toml
 
+from emailer.utils.metrics import STAGE_SECONDS
+from emailer.utils.work_calendar import parse_window
+
+
+def _check_windows(windows: Optional[list[str]]) -> Optional[list[str]]:
+    for window in windows or ():
+        parse_window(window)
+    return windows
+
 
 class MailAccountSettings(BaseSettings):
     """Single mail account credentials."""
     # Support typo 'adress' from TOML via validation alias
     address: str = Field(..., validation_alias="adress", description="Email address")
     password: str = Field(..., description="Email password")
+    max_concurrency: int = Field(1, ge=1, description="Messages in flight at once for this account")
+    # Provider quotas; unset means unlimited
+    max_per_minute: Optional[int] = Field(None, ge=1, description="Messages per minute")
+    max_per_hour: Optional[int] = Field(None, ge=1, description="Messages per hour")
+    max_per_day: Optional[int] = Field(None, ge=1, description="Messages per day")
+    # Own work calendar; unset falls back to [scheduler]
+    workdays: Optional[list[int]] = Field(None, description="Days this account sends on, 0=Mon ... 6=Sun")
+    windows: Optional[list[str]] = Field(None, description="'HH:MM-HH:MM' send windows of this account")
+    holidays: list[date] = Field(default_factory=list, description="Extra days off for this account")
+
+    _validate_windows = field_validator("windows")(_check_windows)
 
 
 class MailSettings(BaseSettings):
@@ -20,6 +42,21 @@ class MailSettings(BaseSettings):
     imap_port: int
     smtp_host: str
     smtp_port: int
+    smtp_starttls: bool = Field(True, description="Upgrade SMTP connections with STARTTLS")
+    smtp_timeout: float = Field(30.0, description="Socket timeout for SMTP connections in seconds")
+    smtp_idle_ttl: int = Field(300, description="Close pooled SMTP sessions idle for this many seconds")
+    credential_check_timeout: float = Field(10.0, gt=0, description="Per-account limit for the startup login check")
+    imap_ssl: bool = Field(True, description="Connect to IMAP over TLS; false for plain IMAP")
+    imap_timeout: float = Field(30.0, gt=0, description="Socket timeout for IMAP connections in seconds")
+    imap_mailbox: str = Field("INBOX", description="Mailbox scanned for bounces and unsubscribe replies")
+    imap_sync_interval: float = Field(300.0, ge=0, description="Seconds between IMAP syncs; 0 disables them")
+    imap_initial_days: int = Field(
+        30, ge=0, description="The first sync of a mailbox only reads mail this many days old; 0 reads all",
+    )
+    smtp_transport: Literal["thread", "asyncio"] = Field(
+        "thread",
+        description="'thread' runs smtplib in the default executor, 'asyncio' uses the native client",
+    )
     # Nested TOML tables expected under [mail.accounts.<key>]
     accounts: dict[str, MailAccountSettings] = Field(
         default_factory=dict,
@@ -35,12 +72,64 @@ class SchedulerSettings(BaseSettings):
     workdays: list[int] = Field(default_factory=lambda: [0, 1, 2, 3, 4])
     start_hour: int = Field(9, description="Start hour in 24h format")
     end_hour: int = Field(17, description="End hour in 24h format (exclusive)")
+    windows: list[str] = Field(
+        default_factory=list,
+        description="'HH:MM-HH:MM' send windows per workday; empty means start_hour to end_hour",
+    )
+    holidays: list[date] = Field(default_factory=list, description="Days without sending")
+    max_workers: int = Field(4, ge=1, description="Jobs sending a batch at the same time")
+    lease_ttl: float = Field(
+        30.0, gt=0, description="Seconds a process keeps a job without renewing before others may take it over",
+    )
+
+    _validate_windows = field_validator("windows")(_check_windows)
+
+    def window_list(self) -> list[str]:
+        return self.windows or [f"{self.start_hour:02d}:00-{self.end_hour:02d}:00"]
+
+
+class RetrySettings(BaseSettings):
+    """Deferred resends after transient SMTP failures (4xx replies, dropped connections)."""
+    max_attempts: int = Field(5, ge=1, description="Sends per recipient before a transient failure is final")
+    base_delay: float = Field(60.0, ge=0, description="Seconds before the first retry; doubles with each attempt")
+    max_delay: float = Field(3600.0, ge=0, description="Upper bound for the delay between retries")
+
+
+class OutboxSettings(BaseSettings):
+    """On-disk spool between rendering and SMTP delivery (outbox/<job id>/)."""
+    ahead: int = Field(200, ge=0, description="Messages rendered into the outbox ahead of delivery")
+    keep_sent: bool = Field(False, description="Keep delivered messages in outbox/<job id>/sent")
+
+
+class ContactSettings(BaseSettings):
+    """Write-back of the 'kontaktiert' column into uploaded workbooks."""
+    flush_interval: int = Field(60, description="Write contacted flags back at least this often (seconds)")
+
+
+class UploadSettings(BaseSettings):
+    """Limits for uploaded images and recipient lists."""
+    max_image_bytes: int = Field(10 * 1024 * 1024, ge=1, description="Largest accepted image upload")
+    max_recipients_bytes: int = Field(50 * 1024 * 1024, ge=1, description="Largest accepted recipient list")
+
+
+class ImageSettings(BaseSettings):
+    """Optimization of inline images embedded into outgoing mails."""
+    optimize: bool = Field(True, description="Downscale and recompress inline images")
+    max_width: int = Field(1200, ge=1, description="Maximum width in pixels")
+    max_height: int = Field(1200, ge=1, description="Maximum height in pixels")
+    jpeg_quality: int = Field(82, ge=1, le=95, description="Quality for re-encoded JPEGs")
+    cache_size: int = Field(64, ge=1, description="Encoded image parts kept in memory")
 
 
 class Settings(BaseSettings):
     """Main application settings loaded from TOML configuration."""
     mail: MailSettings
     scheduler: SchedulerSettings = Field(default_factory=SchedulerSettings)
+    retry: RetrySettings = Field(default_factory=RetrySettings)
+    outbox: OutboxSettings = Field(default_factory=OutboxSettings)
+    contacts: ContactSettings = Field(default_factory=ContactSettings)
+    uploads: UploadSettings = Field(default_factory=UploadSettings)
+    images: ImageSettings = Field(default_factory=ImageSettings)
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
     
     @classmethod
@@ -51,8 +140,12 @@ class Settings(BaseSettings):
         if not toml_path.exists():
             raise FileNotFoundError(f"Configuration file not found: {toml_path}")
         
-        with open(toml_path, "r", encoding="utf-8") as f:
-            config_data = toml.load(f)
+        return cls.from_toml_text(toml_path.read_text(encoding="utf-8"))
+
+    @classmethod
+    def from_toml_text(cls, text: str) -> "Settings":
+        """Build settings from TOML source text."""
+        config_data = toml.loads(text)
 
         # Normalize legacy mail.* subtables into mail.accounts
         mail_cfg = config_data.get("mail")
@@ -75,10 +168,80 @@ class Settings(BaseSettings):
         return cls(**config_data)
 
 
+CONFIG_PATH = Path("config.toml")
+
+# Process-wide settings cache, invalidated by mtime/size and confirmed by content hash
+_settings_lock = threading.Lock()
+_settings: Optional[Settings] = None
+_settings_stamp: Optional[tuple[int, int]] = None
+_settings_digest: Optional[str] = None
+_reload_listeners: list[Callable[[Settings], None]] = []
+
+
+def _config_stamp() -> tuple[int, int]:
+    try:
+        st = CONFIG_PATH.stat()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Configuration file not found: {CONFIG_PATH}")
+    return st.st_mtime_ns, st.st_size
+
+
+def _load_settings(force: bool) -> Settings:
+    global _settings, _settings_stamp, _settings_digest
+    with _settings_lock:
+        stamp = _config_stamp()
+        if not force and _settings is not None and stamp == _settings_stamp:
+            return _settings
+        raw = CONFIG_PATH.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        if not force and _settings is not None and digest == _settings_digest:
+            # Touched but unchanged: keep the parsed models
+            _settings_stamp = stamp
+            return _settings
+        try:
+            with STAGE_SECONDS.time("settings_load"):
+                settings = Settings.from_toml_text(raw.decode("utf-8"))
+        except Exception as exc:
+            if force or _settings is None:
+                raise
+            # Keep serving the last good config while the file is being edited
+            print(f"Ignoring invalid {CONFIG_PATH}: {exc}")
+            _settings_stamp = stamp
+            return _settings
+        _settings, _settings_stamp, _settings_digest = settings, stamp, digest
+        listeners = list(_reload_listeners)
+    for listener in listeners:
+        try:
+            listener(settings)
+        except Exception as exc:
+            print(f"Settings reload listener failed: {exc}")
+    return settings
+
+
 # Global settings instance
 def get_settings() -> Settings:
-    """Get the global settings instance."""
-    return Settings.from_toml()
+    """Get the global settings instance, re-parsed only when config.toml changes."""
+    stamp = _settings_stamp
+    if _settings is not None and stamp is not None:
+        try:
+            if _config_stamp() == stamp:
+                return _settings
+        except FileNotFoundError:
+            return _settings
+    return _load_settings(force=False)
+
+
+def reload_settings() -> Settings:
+    """Force a re-read of config.toml, raising if it is invalid."""
+    return _load_settings(force=True)
+
+
+def on_settings_reload(listener: Callable[[Settings], None]) -> None:
+    """Register a callback invoked with the new settings after each reload.
+
+    Listeners may be called from worker threads.
+    """
+    _reload_listeners.append(listener)
 
 
 # Convenience function for getting genai settings
@@ -0,0 +1,97 @@
+import codecs
+import csv
+from pathlib import Path
+from typing import Any, Iterator
+
+import openpyxl
+
+
+EXCEL_SUFFIXES = (".xlsx", ".xlsm")
+TEXT_SUFFIXES = (".csv", ".tsv")
+TABLE_SUFFIXES = EXCEL_SUFFIXES + TEXT_SUFFIXES
+
+CHUNK_SIZE = 1024 * 1024
+
+# Bytes of a CSV file the delimiter is guessed from
+SNIFF_SIZE = 1024
+
+
+def is_text_table(path: Path) -> bool:
+    return path.suffix.lower() in TEXT_SUFFIXES
+
+
+def _text_encoding(path: Path) -> str:
+    """UTF-8 (with or without BOM) if the whole file decodes as such, else Windows-1252.
+
+    German Excel saves "CSV (Trennzeichen-getrennt)" in Windows-1252. Raises
+    UnicodeDecodeError when the file is neither.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    with open(path, "rb") as f:
+        try:
+            while chunk := f.read(CHUNK_SIZE):
+                decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+            return "utf-8-sig"
+        except UnicodeDecodeError:
+            pass
+    # Windows-1252 leaves a few bytes undefined, so this can fail too
+    with open(path, encoding="cp1252") as f:
+        while f.read(CHUNK_SIZE):
+            pass
+    return "cp1252"
+
+
+def text_table_format(path: Path) -> tuple[str, dict]:
+    """Encoding and csv.reader/csv.writer keyword arguments of a CSV/TSV file.
+
+    The delimiter of a .csv is sniffed from its first KB, as German Excel
+    separates columns with ';'; .tsv files are tab-separated.
+    """
+    encoding = _text_encoding(path)
+    if path.suffix.lower() == ".tsv":
+        return encoding, {"delimiter": "\t"}
+    with open(path, newline="", encoding=encoding) as f:
+        sample = f.read(SNIFF_SIZE)
+    # Only whole lines, so a row cut off in the middle does not skew the counts
+    if "\n" in sample:
+        sample = sample[:sample.rindex("\n") + 1]
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter
+    except csv.Error:
+        # A single column has no delimiter to find
+        delimiter = ","
+    return encoding, {"delimiter": delimiter}
+
+
+def iter_table_rows(path: Path) -> Iterator[tuple[Any, ...]]:
+    """Stream rows of a recipient table (first sheet of a workbook, or CSV/TSV) as value tuples.
+
+    Raises UnicodeDecodeError for a text table that is neither UTF-8 nor Windows-1252.
+    """
+    if is_text_table(path):
+        encoding, dialect = text_table_format(path)
+        with open(path, newline="", encoding=encoding) as f:
+            for row in csv.reader(f, **dialect):
+                yield tuple(row)
+        return
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def header_index(header: tuple[Any, ...], name: str) -> int | None:
+    """Return the 0-based index of the header cell matching name, case-insensitively."""
+    for i, val in enumerate(header):
+        if isinstance(val, str) and val.strip().lower() == name:
+            return i
+    return None
+
+
+def is_true_flag(val: Any) -> bool:
+    """Whether a 'kontaktiert' cell is set: a real boolean in Excel, 'TRUE' in text tables."""
+    if isinstance(val, bool):
+        return val
+    return isinstance(val, str) and val.strip().lower() == "true"
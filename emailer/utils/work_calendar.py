@@ -0,0 +1,147 @@
+from datetime import date, datetime, time as dtime, timedelta, tzinfo
+from typing import Iterable
+import re
+
+
+# How far ahead to look for an open minute before a calendar counts as closed
+SEARCH_DAYS = 400
+MINUTES_PER_DAY = 24 * 60
+
+_WINDOW_RE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$")
+
+Windows = tuple[tuple[int, int], ...]
+
+
+def parse_window(text: str) -> tuple[int, int]:
+    """'HH:MM-HH:MM' as (start, end) minutes after midnight; the end may be '24:00'."""
+    match = _WINDOW_RE.match(text)
+    if not match:
+        raise ValueError(f"Invalid work window {text!r}, expected 'HH:MM-HH:MM'")
+    start_h, start_m, end_h, end_m = map(int, match.groups())
+    start, end = start_h * 60 + start_m, end_h * 60 + end_m
+    if start_m > 59 or end_m > 59 or end > MINUTES_PER_DAY or start >= end:
+        raise ValueError(f"Invalid work window {text!r}")
+    return start, end
+
+
+def _merge(windows: Iterable[tuple[int, int]]) -> Windows:
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+
+def _intersect(a: Windows, b: Windows) -> Windows:
+    result, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        start, end = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if start < end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return tuple(result)
+
+
+class WorkCalendar:
+    """Minutes of the week in which mail may go out, minus holidays, in one time zone.
+
+    Times go in and come out as Unix timestamps, so arithmetic stays correct
+    across daylight saving changes.
+    """
+
+    def __init__(self, week: dict[int, Iterable[tuple[int, int]]], holidays: Iterable[date], tz: tzinfo):
+        # 0=Mon ... 6=Sun -> sorted, non-overlapping windows
+        self.week: dict[int, Windows] = {day: _merge(week.get(day, ())) for day in range(7)}
+        self.holidays = frozenset(holidays)
+        self.tz = tz
+        self._days: dict[date, list[tuple[float, float]]] = {}
+
+    @classmethod
+    def from_schedule(
+        cls, workdays: Iterable[int], windows: Iterable[str], holidays: Iterable[date], tz: tzinfo
+    ) -> "WorkCalendar":
+        """The same ``windows`` ('HH:MM-HH:MM') on each of the ``workdays``."""
+        parsed = [parse_window(window) for window in windows]
+        return cls({day: parsed for day in set(workdays)}, holidays, tz)
+
+    @property
+    def key(self) -> tuple:
+        """Equal for calendars with the same open times."""
+        return tuple(self.week[day] for day in range(7)), tuple(sorted(self.holidays))
+
+    def intersect(self, other: "WorkCalendar") -> "WorkCalendar":
+        """Open only when both calendars are."""
+        week = {day: _intersect(self.week[day], other.week[day]) for day in range(7)}
+        return WorkCalendar(week, self.holidays | other.holidays, self.tz)
+
+    def _intervals(self, day: date) -> list[tuple[float, float]]:
+        intervals = self._days.get(day)
+        if intervals is None:
+            intervals = []
+            if day not in self.holidays:
+                for start, end in self.week[day.weekday()]:
+                    intervals.append((self._at(day, start), self._at(day, end)))
+            if len(self._days) > 1000:
+                self._days.clear()
+            self._days[day] = intervals
+        return intervals
+
+    def _at(self, day: date, minute: int) -> float:
+        if minute >= MINUTES_PER_DAY:
+            day, minute = day + timedelta(days=1), minute - MINUTES_PER_DAY
+        return datetime.combine(day, dtime(minute // 60, minute % 60), self.tz).timestamp()
+
+    def _date(self, ts: float) -> date:
+        return datetime.fromtimestamp(ts, self.tz).date()
+
+    def _open_from(self, ts: float) -> Iterable[tuple[float, float]]:
+        """Open intervals, or their remainders, from ``ts`` on, for up to SEARCH_DAYS days."""
+        day = self._date(ts)
+        for _ in range(SEARCH_DAYS):
+            for start, end in self._intervals(day):
+                if end > ts:
+                    yield max(start, ts), end
+            day += timedelta(days=1)
+
+    def is_open(self, ts: float) -> bool:
+        return any(start <= ts < end for start, end in self._intervals(self._date(ts)))
+
+    def next_open(self, ts: float) -> float:
+        """``ts`` itself when open, else the start of the next window."""
+        for start, _ in self._open_from(ts):
+            return start
+        raise ValueError(f"No work window within {SEARCH_DAYS} days")
+
+    def advance(self, ts: float, seconds: float) -> float:
+        """The moment ``seconds`` of open time after ``ts``; closed time is skipped."""
+        remaining = max(0.0, seconds)
+        while True:
+            moved = False
+            for start, end in self._open_from(ts):
+                moved = True
+                if remaining < end - start:
+                    return start + remaining
+                remaining -= end - start
+                ts = end
+            if not moved:
+                raise ValueError(f"No work window within {SEARCH_DAYS} days")
+
+    def open_seconds(self, start_ts: float, end_ts: float) -> float:
+        """Seconds of open time between two moments."""
+        total = 0.0
+        day, last = self._date(start_ts), self._date(end_ts)
+        while day <= last:
+            for start, end in self._intervals(day):
+                total += max(0.0, min(end, end_ts) - max(start, start_ts))
+            day += timedelta(days=1)
+        return total
+
+    def daily_seconds(self) -> float:
+        """Average open seconds per open day of the week, for quotas given per day."""
+        days = [sum(end - start for start, end in windows) * 60 for windows in self.week.values() if windows]
+        return sum(days) / len(days) if days else 0.0
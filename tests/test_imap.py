@@ -0,0 +1,163 @@
+from types import SimpleNamespace
+
+import pytest
+
+from emailer import services_imap
+from emailer.services_imap import sync_account
+from emailer.services_suppression import SuppressionList
+from emailer.utils.settings import MailSettings
+
+
+ACCOUNT = SimpleNamespace(address="sender@example.com", password="secret")
+
+DSN = b"""From: Mail Delivery System <MAILER-DAEMON@mx.example.com>
+To: sender@example.com
+Subject: Undelivered Mail Returned to Sender
+MIME-Version: 1.0
+Content-Type: multipart/report; report-type=delivery-status; boundary="B"
+
+--B
+Content-Type: text/plain
+
+This is the mail system.
+
+--B
+Content-Type: message/delivery-status
+
+Reporting-MTA: dns; mx.example.com
+
+Final-Recipient: rfc822; gone@example.com
+Action: failed
+Status: 5.1.1
+Diagnostic-Code: smtp; 550 5.1.1 User unknown
+
+Final-Recipient: rfc822; later@example.com
+Action: delayed
+Status: 4.4.1
+
+--B--
+"""
+
+REPLY = """From: Max Muster <max@kunde.de>
+To: sender@example.com
+Subject: AW: Angebot
+In-Reply-To: <1@example.com>
+Content-Type: text/plain; charset=utf-8
+
+Bitte abmelden, ich möchte keine weiteren E-Mails.
+
+Am 1.10.2026 schrieb sender@example.com:
+> Hallo
+""".encode()
+
+# The campaign's Bcc copy to its own sender
+OWN_COPY = b"""From: sender@example.com
+To: max@kunde.de
+Subject: Re: Angebot
+Content-Type: text/plain
+
+Zum Abmelden antworten Sie bitte mit "abmelden".
+"""
+
+NOT_A_REPLY = b"""From: Lisa <lisa@kunde.de>
+To: sender@example.com
+Subject: unsubscribe
+Content-Type: text/plain
+
+Wie kann ich mich vom Newsletter eines Kollegen abmelden?
+"""
+
+
+class FakeImap:
+    """Just enough of imaplib.IMAP4 for sync_account, over a dict of UID -> raw message."""
+
+    def __init__(self, mailbox: "Mailbox"):
+        self.mailbox = mailbox
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def login(self, user, password):
+        return "OK", [b"Logged in"]
+
+    def select(self, mailbox, readonly=False):
+        return "OK", [str(len(self.mailbox.mails)).encode()]
+
+    def response(self, name):
+        values = {"UIDVALIDITY": self.mailbox.uidvalidity, "UIDNEXT": max(self.mailbox.mails, default=0) + 1}
+        return name, [str(values[name]).encode()]
+
+    def uid(self, command, *args):
+        if command == "SEARCH":
+            low = int(args[1].partition(":")[0])
+            uids = [uid for uid in sorted(self.mailbox.mails) if uid >= low]
+            # Like a real server: "n:*" matches the newest message even below n
+            uids = uids or sorted(self.mailbox.mails)[-1:]
+            return "OK", [b" ".join(str(uid).encode() for uid in uids)]
+        assert command == "FETCH"
+        data = []
+        for uid in map(int, args[0].split(",")):
+            self.mailbox.fetched.append(uid)
+            raw = self.mailbox.mails[uid]
+            data += [(f"{uid} (UID {uid} BODY[] {{{len(raw)}}}".encode(), raw), b")"]
+        return "OK", data
+
+
+class Mailbox:
+    def __init__(self, mails: dict[int, bytes], uidvalidity: int = 7):
+        self.mails = mails
+        self.uidvalidity = uidvalidity
+        self.fetched: list[int] = []
+
+    def connect(self) -> FakeImap:
+        return FakeImap(self)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    settings = MailSettings(imap_host="127.0.0.1", imap_port=143, smtp_host="127.0.0.1", smtp_port=25)
+    monkeypatch.setattr(services_imap, "get_mail_settings", lambda: settings)
+    monkeypatch.setattr(services_imap, "configured_accounts", lambda: [ACCOUNT])
+    store = SuppressionList(tmp_path / "suppression.db")
+    yield store
+    store.close()
+
+
+def test_suppresses_permanent_bounces_and_unsubscribe_replies(store):
+    mailbox = Mailbox({3: DSN, 5: REPLY, 6: OWN_COPY, 8: NOT_A_REPLY})
+    assert sync_account(ACCOUNT, store, mailbox.connect) == 2
+    assert "gone@example.com" in store
+    assert store.reason("gone@example.com").startswith("bounce 5.1.1")
+    assert "max@kunde.de" in store
+    # A delayed delivery, the own campaign copy and a question that is no reply
+    assert "later@example.com" not in store
+    assert "sender@example.com" not in store
+    assert "lisa@kunde.de" not in store
+
+
+def test_fetches_only_mail_above_the_watermark(store):
+    mailbox = Mailbox({3: DSN, 5: REPLY})
+    sync_account(ACCOUNT, store, mailbox.connect)
+    assert store.watermark(ACCOUNT.address, "INBOX") == (7, 5)
+
+    mailbox.fetched.clear()
+    assert sync_account(ACCOUNT, store, mailbox.connect) == 0
+    assert mailbox.fetched == []
+
+    mailbox.mails[9] = NOT_A_REPLY
+    sync_account(ACCOUNT, store, mailbox.connect)
+    assert mailbox.fetched == [9]
+    assert store.watermark(ACCOUNT.address, "INBOX") == (7, 9)
+
+
+def test_rereads_the_mailbox_after_uidvalidity_changes(store):
+    mailbox = Mailbox({3: DSN, 5: REPLY})
+    sync_account(ACCOUNT, store, mailbox.connect)
+    mailbox.uidvalidity, mailbox.mails = 8, {1: DSN, 2: REPLY}
+    mailbox.fetched.clear()
+    sync_account(ACCOUNT, store, mailbox.connect)
+    assert mailbox.fetched == [1, 2]
+    assert store.watermark(ACCOUNT.address, "INBOX") == (8, 2)
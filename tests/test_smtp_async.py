@@ -0,0 +1,97 @@
+import asyncio
+import smtplib
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fake_smtp import SmtpSink
+from emailer import services_smtp_async
+from emailer.services_smtp import RawMessage
+from emailer.services_smtp_async import AsyncSmtpPool
+from emailer.utils.settings import MailSettings
+
+
+ACCOUNT = SimpleNamespace(address="sender@example.com", password="secret")
+
+
+def _message(*recipients: str) -> RawMessage:
+    return RawMessage(
+        sender=ACCOUNT.address,
+        recipients=list(recipients),
+        data=b"Subject: test\r\n\r\nHallo\r\n.leading dot\r\n",
+    )
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    sink = SmtpSink(refuse=["nobody@example.com"]).start()
+    settings = MailSettings(
+        imap_host="127.0.0.1", imap_port=143, smtp_host="127.0.0.1", smtp_port=sink.port,
+        smtp_starttls=False, smtp_timeout=5,
+    )
+    monkeypatch.setattr(services_smtp_async, "get_mail_settings", lambda: settings)
+    yield sink
+    sink.stop()
+
+
+def _run(scenario) -> None:
+    async def main():
+        pool = AsyncSmtpPool()
+        try:
+            await scenario(pool)
+        finally:
+            await pool.close_all()
+
+    asyncio.run(main())
+
+
+def test_reuses_one_session_per_account(sink):
+    async def scenario(pool):
+        for i in range(5):
+            await pool.send(ACCOUNT, _message(f"user{i}@example.com", ACCOUNT.address))
+
+    _run(scenario)
+    assert sink.stats["messages"] == 5
+    assert sink.stats["connections"] == 1
+    assert sink.stats["logins"] == 1
+
+
+def test_reconnects_after_the_server_drops_the_session(sink):
+    async def scenario(pool):
+        await pool.send(ACCOUNT, _message("user0@example.com"))
+        sink.drop_connections()
+        await pool.send(ACCOUNT, _message("user1@example.com"))
+
+    _run(scenario)
+    assert sink.stats["messages"] == 2
+    assert sink.stats["connections"] == 2
+
+
+def test_refused_recipient_fails_the_send_but_keeps_the_session(sink):
+    async def scenario(pool):
+        with pytest.raises(smtplib.SMTPRecipientsRefused) as refused:
+            await pool.send(ACCOUNT, _message("nobody@example.com"))
+        assert list(refused.value.recipients) == ["nobody@example.com"]
+        # The copy goes out, but the mail was for the refused recipient
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            await pool.send(ACCOUNT, _message("nobody@example.com", "user0@example.com"))
+        # Only the copy is refused, which does not fail the send
+        await pool.send(ACCOUNT, _message("user1@example.com", "nobody@example.com"))
+
+    _run(scenario)
+    assert sink.stats["messages"] == 2
+    assert sink.stats["connections"] == 1
+
+
+def test_rejected_data_keeps_the_session(sink):
+    async def scenario(pool):
+        sink.error_rate, sink.error_codes = 1.0, (550,)
+        with pytest.raises(smtplib.SMTPDataError) as rejected:
+            await pool.send(ACCOUNT, _message("user0@example.com"))
+        assert rejected.value.smtp_code == 550
+        sink.error_rate = 0.0
+        await pool.send(ACCOUNT, _message("user1@example.com"))
+
+    _run(scenario)
+    assert sink.stats["messages"] == 1
+    assert sink.stats["connections"] == 1